@@ -4,6 +4,32 @@ import socket
 import ssl
 import wbetools
 
+# ---------------------------------------------------------
+# keep-alive 연결 풀: (scheme, host, port) → (소켓, 응답 파일)
+# ---------------------------------------------------------
+SOCKETS = {}
+MAX_IDLE_SOCKETS = 16
+SOCKET_STATS = {"connects": 0, "reuses": 0}
+
+# ---------------------------------------------------------
+# chunked 본문 읽기: "16진수 크기 줄 → 데이터 → CRLF"를 크기 0이 나올 때까지 반복
+# ---------------------------------------------------------
+def read_chunked(response):
+    chunks = []
+    while True:
+        line = response.readline()
+        if not line:  # 본문 중간에 연결이 끊김
+            raise ConnectionError("connection closed")
+        size = int(line.split(b";", 1)[0].strip(), 16)
+        if size == 0:
+            break
+        chunks.append(response.read(size))
+        response.readline()  # 데이터 뒤의 CRLF
+    # 트레일러 헤더는 빈 줄까지 읽고 버림
+    while response.readline() not in (b"\r\n", b""):
+        pass
+    return b"".join(chunks)
+
 # ---------------------------------------------------------
 # URL 클래스: URL 문자열을 파싱하고, 해당 서버에 HTTP 요청을 보내는 기능을 담당
 # ---------------------------------------------------------
@@ -45,6 +71,19 @@ class URL:
     # request(): URL에 접속해 HTTP 요청을 보내고, 응답 본문을 문자열로 반환
     # -----------------------------------------------------
     def request(self):
+        key = (self.scheme, self.host, self.port)
+        # 같은 (scheme, host, port)로 열어둔 소켓이 있으면 재사용 (keep-alive)
+        # (여러 스레드가 동시에 요청해도 안전하도록 pop 한 번으로 꺼냄)
+        conn = SOCKETS.pop(key, None)
+        if conn:
+            s, response = conn
+            SOCKET_STATS["reuses"] += 1
+            try:
+                return self.send(s, response)
+            except ConnectionError:
+                # 서버가 유휴 연결을 닫은 경우 새 연결로 한 번 더 시도
+                s.close()
+
         # TCP 소켓 생성
         s = socket.socket(
             family=socket.AF_INET,          # IPv4
@@ -58,40 +97,73 @@ class URL:
         if self.scheme == "https":
             ctx = ssl.create_default_context()
             s = ctx.wrap_socket(s, server_hostname=self.host)
+        SOCKET_STATS["connects"] += 1
 
-        # HTTP 요청 헤더 작성 (단순 GET 요청)
-        request = "GET {} HTTP/1.0\r\n".format(self.path)
-        request += "Host: {}\r\n".format(self.host)
-        request += "\r\n"  # 빈 줄로 헤더 종료 표시
+        # 응답을 바이너리 모드로 읽기 위한 파일 객체로 변환
+        # (Content-Length 만큼 바이트 단위로 읽어야 연결을 재사용할 수 있음)
+        response = s.makefile("rb")
+        return self.send(s, response)
 
-        # 서버로 요청 전송
-        s.send(request.encode("utf8"))
+    # -----------------------------------------------------
+    # send(): 열린 소켓으로 HTTP/1.1 요청을 보내고 응답 본문을 반환
+    # -----------------------------------------------------
+    def send(self, s, response):
+        # 연결을 풀에 돌려놓은 경우가 아니면 끝날 때(오류 포함) 소켓을 닫음
+        kept = False
+        try:
+            # HTTP 요청 헤더 작성 (단순 GET 요청)
+            request = "GET {} HTTP/1.1\r\n".format(self.path)
+            request += "Host: {}\r\n".format(self.host)
+            request += "\r\n"  # 빈 줄로 헤더 종료 표시
 
-        # 응답을 텍스트 모드로 읽기 위한 파일 객체로 변환
-        response = s.makefile("r", encoding="utf8", newline="\r\n")
-    
-        # 첫 줄(상태 줄) 읽기: 예) "HTTP/1.0 200 OK"
-        statusline = response.readline()
-        version, status, explanation = statusline.split(" ", 2)
-    
-        # 헤더 읽기
-        response_headers = {}
-        while True:
-            line = response.readline()
-            if line == "\r\n":  # 빈 줄이 나오면 헤더 끝
-                break
-            header, value = line.split(":", 1)
-            response_headers[header.casefold()] = value.strip()
-    
-        # 단순화를 위해 압축 전송 등의 복잡한 응답은 처리하지 않음
-        assert "transfer-encoding" not in response_headers
-        assert "content-encoding" not in response_headers
-    
-        # 나머지 본문(HTML 텍스트 등)을 모두 읽음
-        content = response.read()
-        s.close()  # 소켓 닫기
-    
-        return content  # 서버 응답 본문 반환
+            # 서버로 요청 전송
+            s.sendall(request.encode("utf8"))
+
+            # 첫 줄(상태 줄) 읽기: 예) "HTTP/1.1 200 OK"
+            statusline = response.readline().decode("utf8")
+            if not statusline:  # 서버가 이미 연결을 닫음
+                raise ConnectionError("connection closed")
+            version, status, explanation = statusline.split(" ", 2)
+
+            # 헤더 읽기
+            response_headers = {}
+            while True:
+                line = response.readline().decode("utf8")
+                if line in ("\r\n", ""):  # 빈 줄이 나오면 헤더 끝
+                    break
+                header, value = line.split(":", 1)
+                response_headers[header.casefold()] = value.strip()
+
+            # 단순화를 위해 압축된 응답은 처리하지 않음
+            assert "content-encoding" not in response_headers
+
+            # HTTP/1.1 서버는 chunked로 보낼 수 있음
+            if response_headers.get("transfer-encoding", "").casefold() == "chunked":
+                content = read_chunked(response)
+                delimited = True
+            elif "content-length" in response_headers:
+                # Content-Length가 있으면 그만큼만 읽음
+                content = response.read(int(response_headers["content-length"]))
+                delimited = True
+            else:
+                # 길이를 모르면 서버가 연결을 닫을 때까지 읽음
+                content = response.read()
+                delimited = False
+
+            # 본문 끝을 알 수 있으면 연결을 풀에 돌려놓음
+            if delimited and version != "HTTP/1.0" and \
+                    response_headers.get("connection", "").casefold() != "close":
+                key = (self.scheme, self.host, self.port)
+                # 이미 같은 키에 유휴 소켓이 있으면 덮어쓰지 않고 닫음
+                if len(SOCKETS) < MAX_IDLE_SOCKETS and \
+                        SOCKETS.setdefault(key, (s, response)) == (s, response):
+                    kept = True
+
+            return content.decode("utf8")  # 서버 응답 본문 반환
+        finally:
+            if not kept:
+                response.close()
+                s.close()  # 소켓 닫기
 
     # __repr__ 메서드는 객체를 문자열로 표현할 때 사용됨
     # @wbetools.js_hide 데코레이터는 자바스크립트 인터페이스에서 숨기기 위한 장식자
@@ -1,6 +1,7 @@
 # Lab4: 문서 트리 구축하기
 
 import wbetools
+import re
 import socket
 import ssl
 import tkinter
@@ -52,6 +53,8 @@ def print_tree(node, indent=0):
 # -------------------------------
 # HTML 파서: 문자열 → 트리 변환
 # -------------------------------
+DELIMITER = re.compile("([<>])")  # 캡처 그룹이라 split 결과에 구분자도 포함됨
+
 class HTMLParser:
     def __init__(self, body):
         self.body = body
@@ -62,23 +65,24 @@ class HTMLParser:
     # 파싱 시작
     # ---------------------------
     def parse(self):
-        text = ""
+        # 한 글자씩 text += c 로 이어 붙이면 큰 문서에서 느려지므로,
+        # "<" 와 ">" 위치로 한 번에 잘라서 텍스트/태그 조각을 얻음
+        # 예: "a<b>c" → ["a", "<", "b", ">", "c"]
+        parts = DELIMITER.split(self.body)
         in_tag = False
 
-        for c in self.body:
-            if c == "<":                     # 태그 시작
+        for i in range(1, len(parts), 2):
+            text = parts[i - 1]
+            if parts[i] == "<":              # 태그 시작
                 in_tag = True
                 if text: self.add_text(text)
-                text = ""
-            elif c == ">":                   # 태그 끝
+            else:                            # 태그 끝
                 in_tag = False
                 self.add_tag(text)
-                text = ""
-            else:
-                text += c
 
-        if not in_tag and text:
-            self.add_text(text)
+        # 마지막 구분자 뒤에 남은 텍스트
+        if not in_tag and parts[-1]:
+            self.add_text(parts[-1])
 
         return self.finish()
 
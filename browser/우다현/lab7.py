@@ -3,8 +3,10 @@
 import wbetools
 import socket
 import ssl
+import threading
 import tkinter
 import tkinter.font
+from concurrent.futures import ThreadPoolExecutor
 
 from lab2 import WIDTH, HEIGHT, HSTEP, VSTEP, SCROLL_STEP
 from lab3 import FONTS, get_font
@@ -164,6 +166,38 @@ class BlockLayout:
         self.cursor_x += w + font.measure(" ")
 
 
+# =============================
+# 스타일시트 동시 요청
+# =============================
+MAX_FETCH_WORKERS = 16
+MAX_FETCHES_PER_HOST = 6
+HOST_SEMAPHORES = {}
+HOST_SEMAPHORES_LOCK = threading.Lock()
+
+def fetch_stylesheet(base, link):
+    try:
+        # 잘못된 href(지원하지 않는 scheme 등)도 실패한 요청처럼 건너뜀
+        url = base.resolve(link)
+        # 같은 호스트로 동시에 보내는 요청 수를 제한
+        key = (url.scheme, url.host, url.port)
+        with HOST_SEMAPHORES_LOCK:
+            if key not in HOST_SEMAPHORES:
+                HOST_SEMAPHORES[key] = threading.BoundedSemaphore(MAX_FETCHES_PER_HOST)
+            semaphore = HOST_SEMAPHORES[key]
+        with semaphore:
+            return url.request()
+    except Exception:
+        return None
+
+def fetch_stylesheets(base, links):
+    if not links:
+        return []
+    workers = min(MAX_FETCH_WORKERS, len(links))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # map은 입력 순서대로 결과를 돌려줌
+        return list(executor.map(lambda link: fetch_stylesheet(base, link), links))
+
+
 # =============================
 # 탭(Tab)
 # =============================
@@ -182,15 +216,19 @@ class Tab:
         self.nodes = HTMLParser(body).parse()
         rules = DEFAULT_STYLE_SHEET.copy()
 
-        for node in tree_to_list(self.nodes, []):
-            if isinstance(node, Element) and node.tag == "link":
-                if node.attributes.get("rel") == "stylesheet":
-                    try:
-                        rules.extend(
-                            CSSParser(url.resolve(node.attributes["href"]).request()).parse()
-                        )
-                    except:
-                        pass
+        links = [node.attributes["href"]
+                 for node in tree_to_list(self.nodes, [])
+                 if isinstance(node, Element)
+                 and node.tag == "link"
+                 and node.attributes.get("rel") == "stylesheet"
+                 and "href" in node.attributes]
+
+        # 스타일시트를 동시에 내려받고, 결과는 문서 순서대로 합침
+        # (캐스케이드 결과가 순차 처리와 동일하게 유지됨)
+        for body in fetch_stylesheets(url, links):
+            if body is None:
+                continue
+            rules.extend(CSSParser(body).parse())
 
         style(self.nodes, sorted(rules, key=cascade_priority))
 
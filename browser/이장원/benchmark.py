@@ -0,0 +1,619 @@
+import asyncio
+import contextlib
+import gzip
+import hashlib
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tkinter
+import tracemalloc
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from url import URL
+from connection_pool import POOL, ASYNC_POOL, SSL_CONTEXT
+from resolver import RESOLVER
+from http_cache import CACHE, CACHE_DIR
+from fetcher import request_all
+from loader import load_all_async
+from etc import STYLE_STATS, tree_to_list, stylesheet_links, style, restyle, default_rules, cascade_priority, compiled_style_sheet, merge_rules
+from preload_scanner import PreloadScanner
+from html_parser import HTMLParser
+from document_layout import DocumentLayout
+from text import Text
+from element import Element
+from document_store import StoreParser
+from dom_cache import DOMCache, DOM_CACHE, DOM_CACHE_DIR, content_key
+from css_parser import CSSParser
+from rule_index import RuleIndex
+import node
+import etc
+
+PAGES = {}
+COMPRESSED = {}
+OPTIONS = {"gzip": False, "chunked": False, "cache-control": None, "delay": 0,
+           "chunk_delay": 0}
+SENT = {"bytes": 0}
+CHUNK_SIZE = 16 * 1024
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path not in PAGES:
+            self.send_error(404)
+            return
+        time.sleep(OPTIONS["delay"])
+        body = PAGES[self.path]
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        if OPTIONS["cache-control"]:
+            self.send_header("Cache-Control", OPTIONS["cache-control"])
+        if OPTIONS["gzip"] and "gzip" in self.headers.get("Accept-Encoding", ""):
+            if self.path not in COMPRESSED:
+                COMPRESSED[self.path] = gzip.compress(body, 6)
+            body = COMPRESSED[self.path]
+            self.send_header("Content-Encoding", "gzip")
+        if OPTIONS["chunked"]:
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(0, len(body), CHUNK_SIZE):
+                chunk = body[i:i + CHUNK_SIZE]
+                self.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                time.sleep(OPTIONS["chunk_delay"])
+            self.write(b"0\r\n\r\n")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.write(body)
+
+    def write(self, data):
+        SENT["bytes"] += len(data)
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class Server(ThreadingHTTPServer):
+    request_queue_size = 1024
+
+def serve(certfile=None):
+    server = Server(("127.0.0.1", 0), Handler)
+    if certfile:
+        ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ctx.load_cert_chain(certfile)
+        server.socket = ctx.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+@contextlib.contextmanager
+def temporary_cache():
+    CACHE.flush()
+    with tempfile.TemporaryDirectory() as directory:
+        CACHE.directory, CACHE.index = directory, None
+        DOM_CACHE.directory, DOM_CACHE.disk_size = os.path.join(directory, "dom"), None
+        try:
+            yield CACHE
+        finally:
+            CACHE.directory, CACHE.index, CACHE.dirty = CACHE_DIR, None, False
+            DOM_CACHE.directory, DOM_CACHE.disk_size = DOM_CACHE_DIR, None
+
+def timed(f):
+    start = time.perf_counter()
+    f()
+    return time.perf_counter() - start
+
+def bench_keep_alive(n=200):
+    server = serve()
+    PAGES["/style.css"] = b"p { color: red; }\n" * 100
+    url = URL(f"http://127.0.0.1:{server.server_port}/style.css")
+
+    def fetch(keep_alive):
+        for _ in range(n):
+            url.request(keep_alive=keep_alive, use_cache=False)
+
+    POOL.clear()
+    closed = timed(lambda: fetch(False))
+    POOL.clear()
+    POOL.reset_stats()
+    pooled = timed(lambda: fetch(True))
+    print(f"{n} requests, HTTP/1.0: {closed * 1000:.1f}ms")
+    print(f"{n} requests, keep-alive: {pooled * 1000:.1f}ms "
+          f"connects={POOL.stats['connects']} reuses={POOL.stats['reuses']}")
+    server.shutdown()
+
+def sample_page(paragraphs):
+    html = "<html><body>"
+    for i in range(paragraphs):
+        html += f"<p>Paragraph {i} with <b>bold</b> and <i>italic</i> text.</p>\n"
+    return (html + "</body></html>").encode("utf8")
+
+def bench_compression(n=20):
+    server = serve()
+    PAGES["/big.html"] = sample_page(20000)
+    url = URL(f"http://127.0.0.1:{server.server_port}/big.html")
+    for compress, chunked in [(False, False), (True, False), (True, True)]:
+        OPTIONS["gzip"], OPTIONS["chunked"] = compress, chunked
+        SENT["bytes"] = 0
+        elapsed = timed(lambda: [url.request(use_cache=False)
+                                 for _ in range(n)])
+        print(f"gzip={compress} chunked={chunked}: "
+              f"{SENT['bytes'] // n} bytes/page, {elapsed / n * 1000:.1f}ms/page")
+    OPTIONS["gzip"], OPTIONS["chunked"] = False, False
+    server.shutdown()
+
+def bench_cache(n=20):
+    server = serve()
+    PAGES["/big.html"] = sample_page(20000)
+    url = URL(f"http://127.0.0.1:{server.server_port}/big.html")
+    with temporary_cache():
+        for policy in ["no-store", "no-cache", "max-age=3600"]:
+            OPTIONS["cache-control"] = policy
+            CACHE.clear()
+            CACHE.reset_stats()
+            elapsed = timed(lambda: [url.request() for _ in range(n)])
+            print(f"Cache-Control: {policy}: "
+                  f"{elapsed / n * 1000:.2f}ms/load {CACHE.stats}")
+    OPTIONS["cache-control"] = None
+    server.shutdown()
+
+def bench_stylesheets(n=12, delay=0.05):
+    server = serve()
+    base = URL(f"http://127.0.0.1:{server.server_port}/index.html")
+    urls = []
+    for i in range(n):
+        PAGES[f"/{i}.css"] = f"p{i} {{ color: red; }}".encode("utf8")
+        urls.append(base.resolve(f"{i}.css"))
+    OPTIONS["delay"] = delay
+    serial = []
+    elapsed = timed(lambda: serial.extend(url.request(use_cache=False)
+                                          for url in urls))
+    print(f"{n} stylesheets, serial: {elapsed * 1000:.1f}ms")
+    concurrent = []
+    with temporary_cache():
+        elapsed = timed(lambda: concurrent.extend(request_all(urls)))
+    print(f"{n} stylesheets, concurrent: {elapsed * 1000:.1f}ms "
+          f"same order: {serial == concurrent}")
+    OPTIONS["delay"] = 0
+    server.shutdown()
+
+def bench_async(n=300, delay=0.05):
+    server = serve()
+    PAGES["/site.css"] = b"p { color: red; }"
+    urls = []
+    for i in range(n):
+        PAGES[f"/{i}.html"] = (f"<link rel=stylesheet href=site.css>"
+                               f"<p>Page {i}</p>").encode("utf8")
+        urls.append(URL(f"http://127.0.0.1:{server.server_port}/{i}.html"))
+    OPTIONS["delay"] = delay
+    ASYNC_POOL.reset_stats()
+    with temporary_cache():
+        pages = []
+        elapsed = timed(lambda: pages.extend(
+            asyncio.run(load_all_async(urls))))
+    styled = sum(1 for nodes in pages if nodes and any(
+        node.style["color"] == "red" for node in tree_to_list(nodes, [])))
+    print(f"{n} pages with {delay * 1000:.0f}ms latency: "
+          f"{elapsed * 1000:.1f}ms, {styled} styled, "
+          f"connects={ASYNC_POOL.stats['connects']} "
+          f"reuses={ASYNC_POOL.stats['reuses']}")
+    OPTIONS["delay"] = 0
+    server.shutdown()
+
+def self_signed_cert(directory):
+    certfile = os.path.join(directory, "localhost.pem")
+    subprocess.run([
+        "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+        "-days", "1", "-subj", "/CN=localhost",
+        "-addext", "subjectAltName=DNS:localhost",
+        "-keyout", certfile, "-out", certfile,
+    ], check=True, capture_output=True)
+    return certfile
+
+def bench_tls(n=50):
+    with tempfile.TemporaryDirectory() as directory:
+        certfile = self_signed_cert(directory)
+        SSL_CONTEXT.load_verify_locations(certfile)
+        server = serve(certfile)
+        PAGES["/"] = b"hello"
+        url = URL(f"https://localhost:{server.server_port}/")
+        for cached in [False, True]:
+            POOL.reset_stats()
+            POOL.sessions = {}
+            RESOLVER.clear()
+            for _ in range(n):
+                if not cached:
+                    POOL.sessions = {}
+                    RESOLVER.clear()
+                url.request(keep_alive=False, use_cache=False)
+            stats = POOL.stats
+            print(f"DNS and TLS session cache {'on' if cached else 'off'}: "
+                  f"connect {stats['connect_time'] / n * 1000:.2f}ms, "
+                  f"handshake {stats['tls_time'] / n * 1000:.2f}ms, "
+                  f"{stats['sessions_reused']}/{n} sessions resumed")
+        server.shutdown()
+
+def bench_progressive(paragraphs=5000, chunk_delay=0.01):
+    server = serve()
+    PAGES["/slow.html"] = sample_page(paragraphs)
+    url = URL(f"http://127.0.0.1:{server.server_port}/slow.html")
+    OPTIONS["chunked"], OPTIONS["chunk_delay"] = True, chunk_delay
+    start = time.perf_counter()
+    parser = HTMLParser()
+    first_content = None
+    for chunk in url.stream(use_cache=False):
+        parser.feed(chunk)
+        if first_content is None and len(tree_to_list(parser.root(), [])) > 2:
+            first_content = time.perf_counter() - start
+    parser.close()
+    total = time.perf_counter() - start
+    print(f"{len(PAGES['/slow.html'])} bytes in {CHUNK_SIZE}-byte chunks: "
+          f"first content {first_content * 1000:.1f}ms, "
+          f"full document {total * 1000:.1f}ms")
+    OPTIONS["chunked"], OPTIONS["chunk_delay"] = False, 0
+    server.shutdown()
+
+def bench_preload(n=8, paragraphs=5000, delay=0.05, chunk_delay=0.01):
+    server = serve()
+    head = "".join(f"<link rel=stylesheet href={i}.css>" for i in range(n))
+    PAGES["/links.html"] = head.encode("utf8") + sample_page(paragraphs)
+    for i in range(n):
+        PAGES[f"/{i}.css"] = f"p{i} {{ color: red; }}".encode("utf8")
+    url = URL(f"http://127.0.0.1:{server.server_port}/links.html")
+    OPTIONS["chunked"], OPTIONS["chunk_delay"] = True, chunk_delay
+    OPTIONS["delay"] = delay
+
+    def load(preload):
+        parser = HTMLParser()
+        scanner = PreloadScanner(url)
+        for chunk in url.stream(use_cache=False):
+            if preload: scanner.feed(chunk)
+            parser.feed(chunk)
+        links = stylesheet_links(parser.close())
+        bodies = scanner.request_all(links)
+        scanner.close()
+        return bodies, scanner.stats
+
+    with temporary_cache():
+        elapsed = timed(lambda: load(False))
+    print(f"{n} stylesheets after parsing: {elapsed * 1000:.1f}ms")
+    with temporary_cache():
+        result = []
+        elapsed = timed(lambda: result.append(load(True)))
+    print(f"{n} stylesheets preloaded: {elapsed * 1000:.1f}ms {result[0][1]}")
+    OPTIONS["chunked"], OPTIONS["chunk_delay"] = False, 0
+    OPTIONS["delay"] = 0
+    server.shutdown()
+
+def bench_file(paragraphs=100000):
+    server = serve()
+    PAGES["/big.html"] = sample_page(paragraphs)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "big.html")
+        with open(path, "wb") as f:
+            f.write(PAGES["/big.html"])
+        size = len(PAGES["/big.html"]) / 1024 / 1024
+        for url in [URL(f"http://127.0.0.1:{server.server_port}/big.html"),
+                    URL("file://" + path)]:
+            elapsed = timed(lambda: url.request(use_cache=False))
+            print(f"{url.scheme}: {size:.1f}MB in {elapsed * 1000:.1f}ms "
+                  f"({size / elapsed:.0f}MB/s)")
+    server.shutdown()
+
+def prose_page(paragraphs):
+    html = "<html><body>"
+    for i in range(paragraphs):
+        html += "<p>" + "lorem ipsum dolor sit amet " * 40 + "</p>\n"
+    return (html + "</body></html>").encode("utf8")
+
+def bench_tokenizer(sizes=[1, 4, 16]):
+    for name, page in [("markup", sample_page), ("prose", prose_page)]:
+        paragraph = len(page(2)) - len(page(1))
+        for mb in sizes:
+            body = page(mb * 1024 * 1024 // paragraph).decode("utf8")
+            size = len(body) / 1024 / 1024
+            elapsed = timed(lambda: HTMLParser(body).parse())
+            print(f"{size:.1f}MB {name} page: {elapsed * 1000:.0f}ms "
+                  f"({size / elapsed:.2f}MB/s)")
+
+def bench_parser_memory(paragraphs=20000):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "big.html")
+        with open(path, "wb") as f:
+            f.write(prose_page(paragraphs))
+        size = os.path.getsize(path) / 1024 / 1024
+        url = URL("file://" + path)
+        for name, parse in [
+            ("whole body", lambda: HTMLParser(url.request()).parse()),
+            ("streamed", lambda: HTMLParser().read(url.stream())),
+        ]:
+            tracemalloc.start()
+            start = time.perf_counter()
+            nodes = parse()
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{size:.1f}MB page {name}: {elapsed * 1000:.0f}ms, "
+                  f"peak {peak / 1024 / 1024:.1f}MB")
+            del nodes
+
+def nested_page(depth, repeat=20):
+    html = "<html><body>"
+    for i in range(repeat):
+        html += "<div>" * depth + "text <b>bold</b> " * 50 + "</div>" * depth
+    return html + "</body></html>"
+
+def bench_nesting(depths=[10, 100, 1000]):
+    for depth in depths:
+        body = nested_page(depth)
+        tokens = body.count("<") + body.count("text")
+        elapsed = timed(lambda: HTMLParser(body).parse())
+        print(f"depth {depth}: {tokens} tokens in {elapsed * 1000:.1f}ms "
+              f"({elapsed / tokens * 1e6:.2f}us/token)")
+
+def bench_nodes(paragraphs=20000):
+    body = sample_page(paragraphs).decode("utf8")
+    for weak in [False, True]:
+        node.WEAK_PARENTS = weak
+        tracemalloc.start()
+        nodes = HTMLParser(body).parse()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        count = len(tree_to_list(nodes, []))
+        print(f"{count} nodes, {'weak' if weak else 'strong'} parents: "
+              f"{size / 1024 / 1024:.1f}MB ({size / count:.0f} bytes/node)")
+        del nodes
+    node.WEAK_PARENTS = False
+
+def bench_store(paragraphs=100000):
+    body = sample_page(paragraphs).decode("utf8")
+    rules = default_rules()
+    size = len(body) / 1024 / 1024
+    for parser_class in [HTMLParser, StoreParser]:
+        start = time.perf_counter()
+        nodes = parser_class(body).parse()
+        parse_time = time.perf_counter() - start
+        style(nodes, rules)
+        style_time = time.perf_counter() - start - parse_time
+        count = len(tree_to_list(nodes, []))
+        del nodes
+        # Measure memory in a second run, tracing slows everything down
+        tracemalloc.start()
+        nodes = parser_class(body).parse()
+        parsed, _ = tracemalloc.get_traced_memory()
+        style(nodes, rules)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del nodes
+        print(f"{parser_class.__name__} on {size:.1f}MB: {count} nodes, "
+              f"{parsed / count:.0f} bytes/node, parse {parse_time * 1000:.0f}ms, "
+              f"style {style_time * 1000:.0f}ms, peak {peak / 1024 / 1024:.0f}MB")
+
+def script_page(scripts):
+    script = "for (var i = 0; i < n; i++) { if (a[i] < b[i]) html += '<li>' + a[i] + '</li>'; }\n" * 20
+    css = "ul > li { color: red; }\n" * 20
+    html = "<html><head><style>" + css + "</style></head><body>"
+    for i in range(scripts):
+        html += f"<p>Paragraph {i}</p><script>{script}</script>\n"
+    return html + "</body></html>"
+
+def bench_raw_text(scripts=2000):
+    body = script_page(scripts)
+    result = []
+    elapsed = timed(lambda: result.append(HTMLParser(body).parse()))
+    count = len(tree_to_list(result[0], []))
+    size = len(body) / 1024 / 1024
+    print(f"{size:.1f}MB page with {scripts} inline scripts: {count} nodes "
+          f"in {elapsed * 1000:.0f}ms ({size / elapsed:.1f}MB/s)")
+
+def bench_dom_cache(paragraphs=20000, loads=10):
+    body = sample_page(paragraphs).decode("utf8")
+    with tempfile.TemporaryDirectory() as directory:
+        cache = DOMCache(directory)
+        parse = timed(lambda: HTMLParser(body).parse())
+        for i in range(loads):
+            cache.parse(body)
+        memory = cache.stats["restore_time"] / cache.stats["hits"]
+        print(f"{len(body) / 1024 / 1024:.1f}MB page: parse {parse * 1000:.0f}ms, "
+              f"restore from memory {memory * 1000:.0f}ms, "
+              f"hit rate {cache.hit_rate():.0%} over {loads} loads")
+        disk_cache = DOMCache(directory)
+        disk = timed(lambda: disk_cache.lookup(content_key(body)))
+        print(f"restore from disk {disk * 1000:.0f}ms {disk_cache.stats}")
+
+def site_stylesheet(rules):
+    tags = ["div", "span", "p", "a", "li", "ul", "nav", "header", "section", "h1"]
+    declarations = [
+        "color: #333333;", "background-color: white;", "font-size: 110%;",
+        "font-weight: bold;", "margin: 0;", "padding-left: 1.5em;",
+        "border: 1px solid #ccc;", "transition: all .2s ease-in-out;",
+        "font-family: 'Helvetica Neue', Arial, sans-serif;",
+    ]
+    css = ""
+    for i in range(rules):
+        selector = " ".join(tags[(i * k) % len(tags)] for k in range(1, 2 + i % 3))
+        body = "\n  ".join(declarations[(i + k) % len(declarations)] for k in range(5))
+        css += f"{selector} {{\n  {body}\n}}\n\n"
+    return css
+
+def bench_css(rules=20000, attributes=50000):
+    css = site_stylesheet(rules)
+    size = len(css) / 1024 / 1024
+    result = []
+    elapsed = timed(lambda: result.append(CSSParser(css).parse()))
+    print(f"{size:.1f}MB stylesheet, {len(result[0])} rules: "
+          f"{elapsed * 1000:.0f}ms ({size / elapsed:.2f}MB/s)")
+    inline = "color: red; font-size: 120%; font-weight: bold"
+    elapsed = timed(lambda: [CSSParser(inline).body() for i in range(attributes)])
+    print(f"{attributes} style attributes: {elapsed * 1000:.0f}ms "
+          f"({elapsed / attributes * 1e6:.1f}us each)")
+
+def bench_default_css(rules=2000, linked=50, loads=100):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "browser.css")
+        with open(path, "w") as f:
+            f.write(site_stylesheet(rules))
+        cache_dir = os.path.join(directory, "cache")
+        cold = timed(lambda: compiled_style_sheet(path, cache_dir))
+        defaults = []
+        warm = timed(lambda: defaults.append(compiled_style_sheet(path, cache_dir)))
+        print(f"{rules}-rule default sheet: compile {cold * 1000:.1f}ms, "
+              f"load from cache {warm * 1000:.1f}ms")
+    page = CSSParser(site_stylesheet(linked)).parse()
+    resort = timed(lambda: [sorted(defaults[0] + page, key=cascade_priority)
+                            for i in range(loads)]) / loads
+    merge = timed(lambda: [merge_rules(defaults[0], page)
+                           for i in range(loads)]) / loads
+    print(f"per load with {linked} linked rules: re-sort {resort * 1000:.2f}ms, "
+          f"merge {merge * 1000:.2f}ms")
+
+def bench_cascade(rules=2000, paragraphs=2000, depth=50):
+    sheet = merge_rules(default_rules(), CSSParser(site_stylesheet(rules)).parse())
+    for name, page in [("flat", sample_page(paragraphs).decode("utf8")),
+                       (f"{depth} deep", nested_page(depth, 5))]:
+        nodes = HTMLParser(page).parse()
+        count = len(tree_to_list(nodes, []))
+        for key in STYLE_STATS: STYLE_STATS[key] = 0
+        elapsed = timed(lambda: style(nodes, sheet))
+        print(f"{len(sheet)} rules on {count} {name} nodes: {elapsed * 1000:.0f}ms "
+              f"({elapsed / count * 1e6:.1f}us/node) {STYLE_STATS}")
+
+def list_page(items):
+    html = "<html><body><ul>"
+    for i in range(items):
+        html += f"<li><b>Item</b> {i} <i>note</i></li>"
+        if i % 50 == 0: html += "<li style='color:red'>highlighted</li>"
+    return html + "</ul></body></html>"
+
+def check_cousins():
+    # Interned parent styles don't imply equal parent tags
+    nodes = HTMLParser("<body><div><p>one</p></div>"
+                       "<section><p>two</p></section>").parse()
+    rules = CSSParser("section p { color: red; }").parse()
+    style(nodes, merge_rules(default_rules(), rules))
+    colors = [node.style["color"] for node in tree_to_list(nodes, [])
+              if isinstance(node, Element) and node.tag == "p"]
+    if colors != ["black", "red"]:
+        raise Exception("Cousins shared a style: " + repr(colors))
+
+def mixed_page(items):
+    # Sibling parents of different tags, whose children only descendant
+    # rules tell apart
+    html = "<html><body>"
+    for i in range(items):
+        parent = ["div", "section", "nav"][i % 3]
+        html += f"<{parent}><p>Item {i} <a>link</a></p></{parent}>"
+    return html + "</body></html>"
+
+def bench_style_sharing(items=20000):
+    check_cousins()
+    css = site_stylesheet(200) + \
+        "section p { color: red; } nav a { font-style: italic; } div p a { font-weight: bold; }"
+    sheet = merge_rules(default_rules(), CSSParser(css).parse())
+    for name, page in [("list", list_page(items)), ("mixed", mixed_page(items // 4))]:
+        results = []
+        for sharing in [False, True]:
+            etc.STYLE_SHARING = sharing
+            for key in STYLE_STATS: STYLE_STATS[key] = 0
+            nodes = HTMLParser(page).parse()
+            elapsed = timed(lambda: style(nodes, sheet))
+            results.append([node.style.items() for node in tree_to_list(nodes, [])])
+            lookups = STYLE_STATS["shared"] + STYLE_STATS["unshared"]
+            hit_rate = STYLE_STATS["shared"] / lookups if lookups else 0
+            print(f"{name} page, sharing {'on' if sharing else 'off'}: "
+                  f"{len(results[-1])} nodes in {elapsed * 1000:.0f}ms, hit rate {hit_rate:.0%}")
+        etc.STYLE_SHARING = True
+        if results[0] != results[1]:
+            raise Exception("Style sharing changed the computed styles of the " + name + " page")
+
+def bench_style_memory(paragraphs=20000):
+    rules = default_rules()
+    nodes = HTMLParser(sample_page(paragraphs).decode("utf8")).parse()
+    count = len(tree_to_list(nodes, []))
+    tracemalloc.start()
+    style(nodes, rules)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    unique = len({id(node.style) for node in tree_to_list(nodes, [])})
+    print(f"style pass on {count} nodes: {size / 1024 / 1024:.1f}MB "
+          f"({size / count:.0f} bytes/node), {unique} distinct style objects")
+
+def mutate(nodes):
+    ul = nodes.children[0].children[0]
+    items = ul.children
+    # Inherited change, a change nothing matches, a move and a removal
+    items[10].set_style("color:blue")
+    items[20].set_attribute("class", "note")
+    ul.insert_child(0, items[-1])
+    ul.remove_child(items[30])
+
+def bench_restyle(items=20000):
+    rules = RuleIndex(merge_rules(default_rules(), CSSParser(site_stylesheet(200)).parse()))
+    nodes = HTMLParser(list_page(items)).parse()
+    count = len(tree_to_list(nodes, []))
+    full = timed(lambda: style(nodes, rules))
+    mutate(nodes)
+    for key in STYLE_STATS: STYLE_STATS[key] = 0
+    elapsed = timed(lambda: restyle(nodes, rules))
+    print(f"full style of {count} nodes: {full * 1000:.0f}ms; restyle after 4 "
+          f"mutations: {STYLE_STATS['restyled']} nodes in {elapsed * 1000:.2f}ms")
+    fresh = HTMLParser(list_page(items)).parse()
+    mutate(fresh)
+    style(fresh, rules)
+    same = [node.style.items() for node in tree_to_list(nodes, [])] == \
+        [node.style.items() for node in tree_to_list(fresh, [])]
+    print("matches a full style pass:", same)
+
+def bench_layout(paragraphs=2000):
+    # Needs a display: fonts are measured by Tk
+    tkinter.Tk()
+    nodes = HTMLParser(sample_page(paragraphs).decode("utf8")).parse()
+    style(nodes, default_rules())
+    words = sum(len(node.text.split()) for node in tree_to_list(nodes, [])
+                if isinstance(node, Text))
+    document = DocumentLayout(nodes)
+    elapsed = timed(document.layout)
+    print(f"layout of {words} words: {elapsed * 1000:.0f}ms "
+          f"({elapsed / words * 1e6:.1f}us/word)")
+
+BENCHMARKS = {
+    "keep-alive": bench_keep_alive,
+    "compression": bench_compression,
+    "cache": bench_cache,
+    "stylesheets": bench_stylesheets,
+    "async": bench_async,
+    "tls": bench_tls,
+    "progressive": bench_progressive,
+    "preload": bench_preload,
+    "file": bench_file,
+    "tokenizer": bench_tokenizer,
+    "parser-memory": bench_parser_memory,
+    "nesting": bench_nesting,
+    "nodes": bench_nodes,
+    "store": bench_store,
+    "raw-text": bench_raw_text,
+    "dom-cache": bench_dom_cache,
+    "css": bench_css,
+    "default-css": bench_default_css,
+    "cascade": bench_cascade,
+    "style-sharing": bench_style_sharing,
+    "style-memory": bench_style_memory,
+    "restyle": bench_restyle,
+    "layout": bench_layout,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print("==", name)
+        BENCHMARKS[name]()
@@ -57,9 +57,6 @@ class BlockLayout:
         else:
             self.cursor_x = 0
             self.cursor_y = 0
-            self.weight = "normal"
-            self.style = "roman"
-            self.size = 12
 
             self.line = []
             self.recurse(self.node)
@@ -96,24 +93,19 @@ class BlockLayout:
         self.line = []
 
     def word(self, node, word):
-        weight = node.style["font-weight"]
-        style = node.style["font-style"]
-        if style == "normal": style = "roman"
-        size = int(float(node.style["font-size"][:-2]) * .75)
-        font = get_font(self.size, self.weight, self.style)
+        font = get_font(*node.style.font_key)
 
         w = font.measure(word)
         if self.cursor_x + w > self.width:
             self.flush()
-        color = node.style["color"]
+        color = node.style.color
         self.line.append((self.cursor_x, word, font, color))
         self.cursor_x += w + font.measure(" ")
 
     def paint(self):
         cmds = []
-        bgcolor = self.node.style.get("background-color",
-                                      "transparent")
-        if bgcolor != "transparent":
+        bgcolor = self.node.style.background_color
+        if bgcolor is not None:
             x2, y2 = self.x + self.width, self.y + self.height
             rect = DrawRect(self.x, self.y, x2, y2, bgcolor)
             cmds.append(rect)
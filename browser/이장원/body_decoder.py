@@ -0,0 +1,133 @@
+import zlib
+
+ACCEPT_ENCODING = "gzip, deflate"
+
+class LengthDecoder:
+    def __init__(self, length):
+        self.remaining = length
+        self.done = length == 0
+        self.delimited = True
+
+    def feed(self, data):
+        data = data[:self.remaining]
+        self.remaining -= len(data)
+        self.done = self.remaining == 0
+        return data
+
+class EOFDecoder:
+    def __init__(self):
+        self.done = False
+        self.delimited = False
+
+    def feed(self, data):
+        return data
+
+class ChunkedDecoder:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.state = "size"
+        self.remaining = 0
+        self.done = False
+        self.delimited = True
+
+    def line(self):
+        i = self.buffer.find(b"\r\n")
+        if i < 0: return None
+        line = bytes(self.buffer[:i])
+        del self.buffer[:i + 2]
+        return line
+
+    def feed(self, data):
+        self.buffer += data
+        out = []
+        while not self.done:
+            if self.state == "size":
+                line = self.line()
+                if line is None: break
+                self.remaining = int(line.split(b";", 1)[0], 16)
+                self.state = "data" if self.remaining else "trailer"
+            elif self.state == "data":
+                if not self.buffer: break
+                chunk = bytes(self.buffer[:self.remaining])
+                del self.buffer[:len(chunk)]
+                out.append(chunk)
+                self.remaining -= len(chunk)
+                if not self.remaining:
+                    self.state = "data-end"
+            elif self.state == "data-end":
+                if len(self.buffer) < 2: break
+                del self.buffer[:2]
+                self.state = "size"
+            elif self.state == "trailer":
+                line = self.line()
+                if line is None: break
+                if not line:
+                    self.done = True
+        return b"".join(out)
+
+class IdentityDecoder:
+    def decompress(self, data):
+        return data
+
+    def flush(self):
+        return b""
+
+class DeflateDecoder:
+    def __init__(self):
+        self.decoder = None
+        self.head = b""
+
+    def decompress(self, data):
+        if self.decoder is None:
+            self.head += data
+            if len(self.head) < 2: return b""
+            data, self.head = self.head, b""
+            # Some servers send raw deflate without the zlib header
+            zlib_header = data[0] & 0x0f == 8 and (data[0] << 8 | data[1]) % 31 == 0
+            wbits = zlib.MAX_WBITS if zlib_header else -zlib.MAX_WBITS
+            self.decoder = zlib.decompressobj(wbits)
+        return self.decoder.decompress(data)
+
+    def flush(self):
+        if self.decoder is None: return b""
+        return self.decoder.flush()
+
+def content_decoder(encoding):
+    encoding = encoding.casefold()
+    if encoding in ["", "identity"]:
+        return IdentityDecoder()
+    elif encoding in ["gzip", "x-gzip"]:
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == "deflate":
+        return DeflateDecoder()
+    raise Exception("Unsupported content-encoding: " + encoding)
+
+class BodyDecoder:
+    def __init__(self, headers, has_body=True):
+        transfer_encoding = headers.get("transfer-encoding", "").casefold()
+        if not has_body:
+            self.framing = LengthDecoder(0)
+        elif transfer_encoding.endswith("chunked"):
+            self.framing = ChunkedDecoder()
+        elif "content-length" in headers:
+            self.framing = LengthDecoder(int(headers["content-length"]))
+        else:
+            self.framing = EOFDecoder()
+        self.content = content_decoder(headers.get("content-encoding", ""))
+
+    @property
+    def done(self):
+        return self.framing.done
+
+    @property
+    def delimited(self):
+        return self.framing.delimited
+
+    def feed(self, data):
+        return self.content.decompress(self.framing.feed(data))
+
+    def finish(self):
+        if self.delimited and not self.done:
+            raise Exception("Truncated response body")
+        self.framing.done = True
+        return self.content.flush()
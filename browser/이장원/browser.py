@@ -1,15 +1,24 @@
+import hashlib
 import sys
+import time
 import tkinter
 
 from block_layout import WIDTH, HEIGHT, HSTEP, VSTEP
 from document_layout import DocumentLayout
 from url import URL
+from preload_scanner import PreloadScanner
 from html_parser import HTMLParser
-from etc import style, DEFAULT_STYLE_SHEET, tree_to_list, paint_tree, cascade_priority, print_tree
-from css_parser import CSSParser
-from element import Element
+from document_store import StoreParser
+from etc import style, restyle, default_rules, merge_rules, stylesheet_sources, page_rules, paint_tree, print_tree
+from loader import load_async
+from dom_cache import DOM_CACHE, update_key
+from http_cache import CACHE
+from rule_index import RuleIndex
 
 SCROLL_STEP = 100
+PAINT_INTERVAL = 0.1
+# Share of the load time that partial repaints may take in total
+PAINT_BUDGET = 0.25
 
 class Browser:
     def __init__(self):
@@ -32,24 +41,79 @@ class Browser:
             if cmd.bottom < self.scroll: continue
             cmd.execute(self.scroll, self.canvas)
 
-    def load(self, url):
-        body = url.request()
-        self.nodes = HTMLParser(body).parse()
-        rules = DEFAULT_STYLE_SHEET.copy()
-        links = [node.attributes["href"]
-                 for node in tree_to_list(self.nodes, [])
-                 if isinstance(node, Element)
-                 and node.tag == "link"
-                 and node.attributes.get("rel") == "stylesheet"
-                 and "href" in node.attributes]
-        for link in links:
-            style_url = url.resolve(link)
-            try:
-                body = style_url.request()
-            except:
-                continue
-            rules.extend(CSSParser(body).parse())
-        style(self.nodes, sorted(rules, key=cascade_priority))
+    def load(self, url, parser_class=HTMLParser):
+        parser = parser_class()
+        # Snapshots restore plain nodes, so only the default parser uses them
+        dom_cache = DOM_CACHE if parser_class is HTMLParser else None
+        # The body is hashed as it streams in rather than kept for the end
+        digest = hashlib.sha256()
+        first = None
+        count = 0
+        cached = None
+        scanner = PreloadScanner(url)
+        partial_rules = RuleIndex(default_rules())
+        start = time.perf_counter()
+        last_paint = None
+        paint_time = 0
+        try:
+            for chunk in url.stream():
+                scanner.feed(chunk)
+                count += 1
+                if dom_cache: update_key(digest, chunk)
+                # A reload served by the HTTP cache arrives as a single chunk,
+                # whose tree a snapshot may already hold
+                if dom_cache and count == 1:
+                    cached = dom_cache.lookup(digest.hexdigest())
+                    if cached is not None:
+                        first = chunk
+                        continue
+                if cached is not None:
+                    # More text followed, so the snapshot was of a shorter body
+                    parser.feed(first)
+                    first = cached = None
+                parser.feed(chunk)
+                now = time.perf_counter()
+                # Each repaint redoes the whole tree so far, so they are kept
+                # to a share of the elapsed time rather than to a fixed rate
+                if last_paint is None or now - last_paint >= PAINT_INTERVAL \
+                        and paint_time <= PAINT_BUDGET * (now - start):
+                    self.paint_partial(parser.root(), partial_rules)
+                    last_paint = time.perf_counter()
+                    paint_time += last_paint - now
+            if cached is not None:
+                self.nodes = cached
+            else:
+                self.nodes = parser.close()
+                # Only a body that can come back in one chunk is worth a
+                # snapshot: a short one, or one the HTTP cache kept
+                if dom_cache and (count == 1 or CACHE.contains(str(url))):
+                    dom_cache.store(digest.hexdigest(), self.nodes)
+            sources = stylesheet_sources(self.nodes)
+            links = [value for kind, value in sources if kind == "link"]
+            rules = page_rules(sources, scanner.request_all(links))
+        finally:
+            scanner.close()
+        # Kept so that later mutations only restyle what they touched
+        self.rules = RuleIndex(merge_rules(default_rules(), rules))
+        style(self.nodes, self.rules)
+        self.render()
+
+    def restyle(self):
+        restyle(self.nodes, self.rules)
+        self.render()
+
+    async def load_async(self, url):
+        self.nodes, self.rules = await load_async(url)
+        self.render()
+
+    def paint_partial(self, nodes, rules):
+        if nodes is None: return
+        self.nodes = nodes
+        style(self.nodes, rules)
+        self.render()
+        self.window.update_idletasks()
+
+    def render(self):
         self.document = DocumentLayout(self.nodes)
         self.document.layout()
         self.display_list = []
@@ -62,8 +126,9 @@ class Browser:
         self.draw()
 
 if __name__ == "__main__":
-    Browser().load(URL(sys.argv[1]))
-    body = URL(sys.argv[1]).request()
-    nodes = HTMLParser(body).parse()
+    # --store keeps the DOM in flat arrays, for pages too big for node objects
+    parser_class = StoreParser if "--store" in sys.argv[2:] else HTMLParser
+    Browser().load(URL(sys.argv[1]), parser_class)
+    nodes = parser_class().read(URL(sys.argv[1]).stream())
     print_tree(nodes)
     tkinter.mainloop()
@@ -0,0 +1,71 @@
+import codecs
+import re
+
+DEFAULT_CHARSET = "utf-8"
+SNIFF_LENGTH = 1024
+META_CHARSET = re.compile(
+    rb"""<meta[^>]*charset\s*=\s*["']?\s*([a-z0-9_:.+-]+)""", re.IGNORECASE)
+CSS_CHARSET = re.compile(rb'@charset "([a-z0-9_:.+-]+)";', re.IGNORECASE)
+BOMS = [
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+def header_charset(content_type):
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.partition("=")
+        if name.strip().casefold() == "charset":
+            return value.strip().strip("\"'")
+    return None
+
+def sniff_charset(body):
+    head = body[:SNIFF_LENGTH]
+    match = CSS_CHARSET.match(head) or META_CHARSET.search(head)
+    return match.group(1).decode("ascii") if match else None
+
+def known(charset):
+    try:
+        codecs.lookup(charset)
+        return True
+    except LookupError:
+        return False
+
+def detect_charset(body, content_type=""):
+    head = body[:SNIFF_LENGTH]
+    for bom, charset in BOMS:
+        if head.startswith(bom):
+            return charset
+    for charset in [header_charset(content_type), sniff_charset(head)]:
+        if charset and known(charset):
+            return charset
+    return DEFAULT_CHARSET
+
+def decode_body(body, content_type=""):
+    return str(body, detect_charset(body, content_type), "replace")
+
+class StreamDecoder:
+    def __init__(self, content_type=""):
+        self.content_type = content_type
+        self.head = b""
+        self.decoder = None
+
+    def start(self, data):
+        charset = detect_charset(data, self.content_type)
+        self.decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+
+    def feed(self, data):
+        if self.decoder is None:
+            # Hold back the first bytes until there is enough to sniff
+            self.head += data
+            if len(self.head) < SNIFF_LENGTH: return ""
+            data, self.head = self.head, b""
+            self.start(data)
+        return self.decoder.decode(data)
+
+    def finish(self):
+        data = b""
+        if self.decoder is None:
+            data, self.head = self.head, b""
+            self.start(data)
+        return self.decoder.decode(data, final=True)
@@ -0,0 +1,106 @@
+import weakref
+
+INHERITED_PROPERTIES = {
+    "font-size": "16px",
+    "font-style": "normal",
+    "font-weight": "normal",
+    "color": "black",
+}
+
+# Identical styles are built once; a style is freed with its last node
+STYLES = weakref.WeakValueDictionary()
+
+def parse_px(value, default):
+    try:
+        return float(value[:-2])
+    except ValueError:
+        return default
+
+def parse_weight(value):
+    if value in ["bold", "bolder"]: return "bold"
+    if value.isdigit() and int(value) >= 600: return "bold"
+    return "normal"
+
+def parse_slant(value):
+    return "italic" if value in ["italic", "oblique"] else "roman"
+
+def parse_color(value):
+    value = value.casefold()
+    if value == "transparent": return None
+    if len(value) == 4 and value.startswith("#"):
+        return "#" + "".join(c * 2 for c in value[1:])
+    return value
+
+DEFAULT_FONT_SIZE = parse_px(INHERITED_PROPERTIES["font-size"], 16.0)
+
+class ComputedStyle:
+    __slots__ = ("properties", "parent", "inherit", "font_size", "font_weight",
+                 "font_slant", "font_key", "color", "background_color",
+                 "__weakref__")
+
+    def __init__(self, properties, parent):
+        # Only the values set on this node; inherited ones come from parent
+        self.properties = properties
+        self.parent = parent
+        # Skip ancestors that set no inherited property themselves
+        if parent is None or any(p in parent.properties for p in INHERITED_PROPERTIES):
+            self.inherit = parent
+        else:
+            self.inherit = parent.inherit
+        # Typed values for layout, worked out once per distinct style
+        if parent is None:
+            self.font_size = parse_px(self["font-size"], DEFAULT_FONT_SIZE)
+            self.font_weight = parse_weight(self["font-weight"])
+            self.font_slant = parse_slant(self["font-style"])
+            self.color = parse_color(self["color"])
+        else:
+            self.font_size = parse_px(properties["font-size"], parent.font_size) \
+                if "font-size" in properties else parent.font_size
+            self.font_weight = parse_weight(properties["font-weight"]) \
+                if "font-weight" in properties else parent.font_weight
+            self.font_slant = parse_slant(properties["font-style"]) \
+                if "font-style" in properties else parent.font_slant
+            self.color = parse_color(properties["color"]) \
+                if "color" in properties else parent.color
+        self.background_color = parse_color(properties.get("background-color", "transparent"))
+        # Tk font sizes are in points
+        self.font_key = (int(self.font_size * .75), self.font_weight, self.font_slant)
+
+    def __getitem__(self, property):
+        if property in self.properties:
+            return self.properties[property]
+        if property not in INHERITED_PROPERTIES:
+            raise KeyError(property)
+        style = self.inherit
+        while style is not None:
+            if property in style.properties:
+                return style.properties[property]
+            style = style.inherit
+        return INHERITED_PROPERTIES[property]
+
+    def get(self, property, default=None):
+        try:
+            return self[property]
+        except KeyError:
+            return default
+
+    def __contains__(self, property):
+        return property in self.properties or property in INHERITED_PROPERTIES
+
+    def keys(self):
+        return list(INHERITED_PROPERTIES) + \
+            [p for p in self.properties if p not in INHERITED_PROPERTIES]
+
+    def items(self):
+        return [(property, self[property]) for property in self.keys()]
+
+    def __repr__(self):
+        return "ComputedStyle(" + repr(dict(self.items())) + ")"
+
+def computed_style(properties, parent):
+    key = (frozenset(properties.items()), parent)
+    style = STYLES.get(key)
+    if style is None:
+        style = ComputedStyle(properties, parent)
+        STYLES[key] = style
+    return style
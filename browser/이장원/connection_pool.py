@@ -0,0 +1,161 @@
+import asyncio
+import socket
+import ssl
+import threading
+import time
+import weakref
+
+from resolver import RESOLVER
+
+MAX_IDLE_PER_HOST = 4
+BUFFER_SIZE = 64 * 1024
+SSL_CONTEXT = ssl.create_default_context()
+
+class ConnectionPool:
+    def __init__(self, max_idle=MAX_IDLE_PER_HOST):
+        self.max_idle = max_idle
+        self.idle = {}
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def connect(self, scheme, host, port):
+        start = time.perf_counter()
+        address = RESOLVER.resolve(host, port)
+        s = socket.socket(
+            family=socket.AF_INET,
+            type=socket.SOCK_STREAM,
+            proto=socket.IPPROTO_TCP
+        )
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            s.connect(address)
+        except OSError:
+            RESOLVER.forget(host, port)
+            s.close()
+            raise
+        connected = time.perf_counter()
+        if scheme == "https":
+            session = self.sessions.get((host, port))
+            s = SSL_CONTEXT.wrap_socket(s, server_hostname=host, session=session)
+        end = time.perf_counter()
+        with self.lock:
+            self.stats["connects"] += 1
+            self.stats["connect_time"] += connected - start
+            if scheme == "https":
+                self.stats["tls_time"] += end - connected
+                self.stats["sessions_reused"] += s.session_reused
+        return s, s.makefile("rb", buffering=BUFFER_SIZE)
+
+    def save_session(self, s):
+        if not isinstance(s, ssl.SSLSocket) or s.session is None: return
+        try:
+            port = s.getpeername()[1]
+        except OSError:
+            return
+        with self.lock:
+            self.sessions[(s.server_hostname, port)] = s.session
+
+    def acquire(self, scheme, host, port):
+        key = (scheme, host, port)
+        with self.lock:
+            if self.idle.get(key):
+                self.stats["reuses"] += 1
+                return self.idle[key].pop(), True
+        return self.connect(scheme, host, port), False
+
+    def release(self, scheme, host, port, conn):
+        key = (scheme, host, port)
+        self.save_session(conn[0])
+        with self.lock:
+            idle = self.idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        self.close(conn)
+
+    def close(self, conn):
+        s, response = conn
+        self.save_session(s)
+        response.close()
+        s.close()
+        with self.lock:
+            self.stats["closes"] += 1
+
+    def reset_stats(self):
+        self.stats = {"connects": 0, "reuses": 0, "closes": 0,
+                      "connect_time": 0.0, "tls_time": 0.0,
+                      "sessions_reused": 0}
+
+    def clear(self):
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                self.close(conn)
+
+class AsyncConnectionPool:
+    def __init__(self, max_idle=MAX_IDLE_PER_HOST):
+        self.max_idle = max_idle
+        # Streams belong to the loop that opened them; a loop that is
+        # dropped without close_loop takes its entries with it
+        self.idle = weakref.WeakKeyDictionary()
+        self.reset_stats()
+
+    async def connect(self, scheme, host, port):
+        start = time.perf_counter()
+        ip, _ = await RESOLVER.resolve_async(host, port)
+        # asyncio does not expose TLS sessions, so only the context is shared
+        ctx = SSL_CONTEXT if scheme == "https" else None
+        try:
+            reader, writer = await asyncio.open_connection(
+                ip, port, ssl=ctx, server_hostname=host if ctx else None,
+                limit=BUFFER_SIZE)
+        except OSError:
+            RESOLVER.forget(host, port)
+            raise
+        self.stats["connects"] += 1
+        self.stats["connect_time"] += time.perf_counter() - start
+        return reader, writer
+
+    async def acquire(self, scheme, host, port):
+        idle = self.idle.get(asyncio.get_running_loop(), {}).get((scheme, host, port), [])
+        while idle:
+            reader, writer = idle.pop()
+            if writer.is_closing() or reader.at_eof():
+                self.close((reader, writer))
+                continue
+            self.stats["reuses"] += 1
+            return (reader, writer), True
+        return await self.connect(scheme, host, port), False
+
+    def release(self, scheme, host, port, conn):
+        hosts = self.idle.setdefault(asyncio.get_running_loop(), {})
+        idle = hosts.setdefault((scheme, host, port), [])
+        if len(idle) < self.max_idle:
+            idle.append(conn)
+        else:
+            self.close(conn)
+
+    def close(self, conn):
+        reader, writer = conn
+        writer.close()
+        self.stats["closes"] += 1
+
+    async def close_loop(self):
+        # Transports can only be closed while their loop still runs
+        hosts = self.idle.pop(asyncio.get_running_loop(), {})
+        writers = []
+        for conns in hosts.values():
+            for conn in conns:
+                self.close(conn)
+                writers.append(conn[1])
+        await asyncio.gather(*[writer.wait_closed() for writer in writers],
+                             return_exceptions=True)
+
+    def reset_stats(self):
+        self.stats = {"connects": 0, "reuses": 0, "closes": 0,
+                      "connect_time": 0.0}
+
+POOL = ConnectionPool()
+ASYNC_POOL = AsyncConnectionPool()
@@ -1,14 +1,27 @@
+import re
+
 from descendant_selector import DescendantSelector
 from tag_selector import TagSelector
 
+WHITESPACE = re.compile(r"\s*")
+# \w is isalnum() plus "_", so a word is cut short at the first "_" below
+WORD = re.compile(r"[\w#.%-]+")
+DECLARATION = re.compile(r"([\w#.%-]+)\s*:\s*([\w#.%-]+)\s*;\s*")
+STOP_CHARS = {}
+
+def stop_chars(chars):
+    key = "".join(chars)
+    if key not in STOP_CHARS:
+        STOP_CHARS[key] = re.compile("[" + re.escape(key) + "]")
+    return STOP_CHARS[key]
+
 class CSSParser:
     def __init__(self, s):
         self.s = s
         self.i = 0
 
     def whitespace(self):
-        while self.i < len(self.s) and self.s[self.i].isspace():
-            self.i += 1
+        self.i = WHITESPACE.match(self.s, self.i).end()
 
     def literal(self, literal):
         if not (self.i < len(self.s) and self.s[self.i] == literal):
@@ -16,23 +29,20 @@ class CSSParser:
         self.i += 1
 
     def word(self):
-        start = self.i
-        while self.i < len(self.s):
-            if self.s[self.i].isalnum() or self.s[self.i] in "#-.%":
-                self.i += 1
-            else:
-                break
-        if not (self.i > start):
+        match = WORD.match(self.s, self.i)
+        word = match.group().split("_", 1)[0] if match else ""
+        if not word:
             raise Exception("Parsing error")
-        return self.s[start:self.i]
+        self.i += len(word)
+        return word
 
     def ignore_until(self, chars):
-        while self.i < len(self.s):
-            if self.s[self.i] in chars:
-                return self.s[self.i]
-            else:
-                self.i += 1
-        return None
+        match = stop_chars(chars).search(self.s, self.i)
+        if not match:
+            self.i = len(self.s)
+            return None
+        self.i = match.start()
+        return match.group()
 
     def pair(self):
         prop = self.word()
@@ -55,6 +65,13 @@ class CSSParser:
     def body(self):
         pairs = {}
         while self.i < len(self.s) and self.s[self.i] != "}":
+            # A well-formed "prop: value;" is taken in one match; anything
+            # else goes through pair() and the usual error recovery
+            match = DECLARATION.match(self.s, self.i)
+            if match and "_" not in match.group(1) and "_" not in match.group(2):
+                pairs[match.group(1).casefold()] = match.group(2)
+                self.i = match.end()
+                continue
             try:
                 prop, val = self.pair()
                 pairs[prop.casefold()] = val
@@ -0,0 +1,183 @@
+from array import array
+
+from element import Element
+from text import Text
+from html_parser import HTMLParser
+from node import EMPTY_ATTRIBUTES
+
+NO_NODE = -1
+TEXT_TAG = -1
+FLUSH_PIECES = 64 * 1024
+
+class DocumentStore:
+    def __init__(self):
+        # One slot per node in each array, indexed by node number
+        self.parents = array("i")
+        self.first_children = array("i")
+        self.last_children = array("i")
+        self.next_siblings = array("i")
+        self.tags = array("i")
+        self.starts = array("q")
+        self.ends = array("q")
+        self.styles = []
+        # Only the few nodes that have attributes get an entry
+        self.attributes = {}
+        self.tag_names = []
+        self.tag_ids = {}
+        # Text is appended to pending and joined into buffer in batches
+        self.buffer = ""
+        self.pending = []
+        self.length = 0
+
+    def __len__(self):
+        return len(self.tags)
+
+    def add_node(self, tag, parent, start, end):
+        index = len(self.tags)
+        self.parents.append(parent)
+        self.first_children.append(NO_NODE)
+        self.last_children.append(NO_NODE)
+        self.next_siblings.append(NO_NODE)
+        self.tags.append(tag)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.styles.append(None)
+        if parent != NO_NODE:
+            last = self.last_children[parent]
+            if last == NO_NODE:
+                self.first_children[parent] = index
+            else:
+                self.next_siblings[last] = index
+            self.last_children[parent] = index
+        return index
+
+    def add_element(self, tag, attributes, parent):
+        if tag not in self.tag_ids:
+            self.tag_ids[tag] = len(self.tag_names)
+            self.tag_names.append(tag)
+        index = self.add_node(self.tag_ids[tag], parent, 0, 0)
+        if attributes: self.attributes[index] = attributes
+        return index
+
+    def add_text(self, text, parent):
+        start = self.length
+        self.pending.append(text)
+        self.length += len(text)
+        # Small strings cost more in object headers than in characters
+        if len(self.pending) >= FLUSH_PIECES: self.flush()
+        return self.add_node(TEXT_TAG, parent, start, self.length)
+
+    def flush(self):
+        if self.pending:
+            self.buffer = "".join([self.buffer] + self.pending)
+            self.pending = []
+
+    def text(self, index):
+        self.flush()
+        return self.buffer[self.starts[index]:self.ends[index]]
+
+    def children(self, index):
+        children = []
+        child = self.first_children[index]
+        while child != NO_NODE:
+            children.append(child)
+            child = self.next_siblings[child]
+        return children
+
+    def view(self, index):
+        if self.tags[index] == TEXT_TAG:
+            return TextView(self, index)
+        return ElementView(self, index)
+
+    def nbytes(self):
+        arrays = [self.parents, self.first_children, self.last_children,
+                  self.next_siblings, self.tags, self.starts, self.ends]
+        return sum(a.itemsize * len(a) for a in arrays) \
+            + 8 * len(self.styles) + len(self.buffer)
+
+class NodeView:
+    __slots__ = ()
+    # Stored documents are not mutated, so they never need a restyle
+    dirty = 0
+
+    # Views are made on demand, so two views of one node compare equal
+    def __eq__(self, other):
+        return isinstance(other, NodeView) \
+            and self.store is other.store and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.store), self.index))
+
+    @property
+    def parent(self):
+        parent = self.store.parents[self.index]
+        return None if parent == NO_NODE else self.store.view(parent)
+
+    @property
+    def children(self):
+        return [self.store.view(child) for child in self.store.children(self.index)]
+
+    @property
+    def style(self):
+        return self.store.styles[self.index]
+
+    @style.setter
+    def style(self, style):
+        self.store.styles[self.index] = style
+
+class ElementView(NodeView, Element):
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    @property
+    def tag(self):
+        return self.store.tag_names[self.store.tags[self.index]]
+
+    @property
+    def attributes(self):
+        return self.store.attributes.get(self.index, EMPTY_ATTRIBUTES)
+
+    def append(self, child):
+        raise Exception("Stored elements are built by StoreParser")
+
+    def set_attribute(self, name, value):
+        raise Exception("Stored elements are read-only")
+
+    def remove_attribute(self, name):
+        raise Exception("Stored elements are read-only")
+
+    def insert_child(self, index, child):
+        raise Exception("Stored elements are read-only")
+
+    def remove_child(self, child):
+        raise Exception("Stored elements are read-only")
+
+class TextView(NodeView, Text):
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    @property
+    def text(self):
+        return self.store.text(self.index)
+
+class StoreParser(HTMLParser):
+    def __init__(self, body=""):
+        super().__init__(body)
+        self.store = DocumentStore()
+
+    def new_text(self, text, parent):
+        self.store.add_text(text, parent.index)
+
+    def new_element(self, tag, attributes, parent):
+        parent = parent.index if parent else NO_NODE
+        return self.store.view(self.store.add_element(tag, attributes, parent))
+
+    def finish(self):
+        self.store.flush()
+        return super().finish()
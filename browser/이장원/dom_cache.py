@@ -0,0 +1,188 @@
+import contextlib
+import gc
+import hashlib
+import marshal
+import os
+import threading
+import time
+
+from element import Element
+from text import Text
+from html_parser import HTMLParser
+from etc import tree_to_list
+
+DOM_CACHE_DIR = os.path.expanduser("~/.cache/tf-web-browser/dom")
+MAX_ENTRIES = 32
+MAX_DISK_SIZE = 256 * 1024 * 1024
+# Eviction goes below the cap, so the directory isn't rescanned every store
+EVICT_TO = 0.75
+
+def update_key(digest, text):
+    digest.update(text.encode("utf8", "surrogatepass"))
+
+def content_key(text):
+    # Feeding a body to update_key in pieces gives the same key
+    digest = hashlib.sha256()
+    update_key(digest, text)
+    return digest.hexdigest()
+
+@contextlib.contextmanager
+def paused_gc():
+    # Allocating a whole tree at once would otherwise trigger one full
+    # collection after another without freeing anything
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled: gc.enable()
+
+def snapshot(nodes):
+    # Preorder tags, attributes or text, and parent positions; a text node
+    # has no tag. Only builtin types, so it can be marshalled as is.
+    tags, values, parents = [], [], []
+    index = {}
+    for node in tree_to_list(nodes, []):
+        index[id(node)] = len(tags)
+        parent = node.parent
+        parents.append(index[id(parent)] if parent is not None else -1)
+        if isinstance(node, Text):
+            tags.append(None)
+            values.append(node.text)
+        else:
+            tags.append(node.tag)
+            values.append(dict(node.attributes) if node.attributes else None)
+    return tags, values, parents
+
+def restore(snapshot):
+    tags, values, parents = snapshot
+    nodes = []
+    with paused_gc():
+        for tag, value, parent in zip(tags, values, parents):
+            parent = nodes[parent] if parent >= 0 else None
+            if tag is None:
+                node = Text(value, parent)
+            else:
+                node = Element(tag, dict(value) if value else None, parent)
+            if parent is not None: parent.append(node)
+            nodes.append(node)
+    return nodes[0]
+
+class DOMCache:
+    def __init__(self, directory=None, max_entries=MAX_ENTRIES,
+                 max_disk_size=MAX_DISK_SIZE):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_disk_size = max_disk_size
+        self.entries = {}
+        # Bytes on disk, counted once and then kept up to date by store
+        self.disk_size = None
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0,
+                      "evictions": 0, "restore_time": 0, "parse_time": 0}
+
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def lookup(self, key):
+        start = time.perf_counter()
+        with self.lock:
+            snapshot = self.entries.get(key)
+            # Re-inserting keeps the entries in least-recently-used order
+            if snapshot is not None:
+                self.entries[key] = self.entries.pop(key)
+        if snapshot is None and self.directory:
+            try:
+                with open(self.path(key), "rb") as f, paused_gc():
+                    snapshot = marshal.load(f)
+            except (OSError, EOFError, ValueError, TypeError):
+                snapshot = None
+            if snapshot is not None:
+                self.remember(key, snapshot)
+                with self.lock:
+                    self.stats["disk_hits"] += 1
+        if snapshot is None:
+            with self.lock:
+                self.stats["misses"] += 1
+            return None
+        nodes = restore(snapshot)
+        with self.lock:
+            self.stats["hits"] += 1
+            self.stats["restore_time"] += time.perf_counter() - start
+        return nodes
+
+    def remember(self, key, snapshot):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = snapshot
+            while len(self.entries) > self.max_entries:
+                del self.entries[next(iter(self.entries))]
+                self.stats["evictions"] += 1
+
+    def store(self, key, nodes):
+        data = snapshot(nodes)
+        self.remember(key, data)
+        with self.lock:
+            self.stats["stores"] += 1
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = self.path(key + ".tmp")
+            with open(tmp, "wb") as f:
+                marshal.dump(data, f)
+            size = os.path.getsize(tmp)
+            with self.lock:
+                if self.disk_size is None:
+                    self.disk_size = sum(f.stat().st_size for f in os.scandir(self.directory)
+                                         if f.path != tmp)
+                try:
+                    self.disk_size -= os.path.getsize(self.path(key))
+                except OSError:
+                    pass
+                os.replace(tmp, self.path(key))
+                self.disk_size += size
+                full = self.disk_size > self.max_disk_size
+            if full: self.evict_disk()
+
+    def evict_disk(self):
+        with self.lock:
+            files = sorted(os.scandir(self.directory), key=lambda f: f.stat().st_mtime)
+            total = sum(f.stat().st_size for f in files)
+            for f in files:
+                if total <= self.max_disk_size * EVICT_TO: break
+                total -= f.stat().st_size
+                try:
+                    os.remove(f.path)
+                except OSError:
+                    pass
+            self.disk_size = total
+
+    def parse(self, body):
+        key = content_key(body)
+        nodes = self.lookup(key)
+        if nodes is not None: return nodes
+        start = time.perf_counter()
+        nodes = HTMLParser(body).parse()
+        with self.lock:
+            self.stats["parse_time"] += time.perf_counter() - start
+        self.store(key, nodes)
+        return nodes
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            self.disk_size = None
+        if self.directory and os.path.isdir(self.directory):
+            for f in os.scandir(self.directory):
+                try:
+                    os.remove(f.path)
+                except OSError:
+                    pass
+
+DOM_CACHE = DOMCache(DOM_CACHE_DIR)
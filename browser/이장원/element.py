@@ -1,9 +1,53 @@
-class Element:
+import sys
+
+from node import Node, EMPTY_ATTRIBUTES, EMPTY_CHILDREN, DIRTY_SUBTREE
+
+class Element(Node):
+    __slots__ = ("tag", "attributes", "children")
+
     def __init__(self, tag, attributes, parent):
-        self.tag = tag
-        self.attributes = attributes
-        self.children = []
+        self.tag = sys.intern(tag)
+        self.attributes = attributes or EMPTY_ATTRIBUTES
+        self.children = EMPTY_CHILDREN
         self.parent = parent
+        self.dirty = 0
+
+    def append(self, child):
+        # Most elements have no children, so the list is only made when needed
+        if self.children is EMPTY_CHILDREN:
+            self.children = []
+        self.children.append(child)
+
+    def set_attribute(self, name, value):
+        if self.attributes is EMPTY_ATTRIBUTES:
+            self.attributes = {}
+        self.attributes[name] = value
+        self.mark_dirty()
+
+    def remove_attribute(self, name):
+        if name not in self.attributes: return
+        del self.attributes[name]
+        self.mark_dirty()
+
+    def set_style(self, text):
+        self.set_attribute("style", text)
+
+    def insert_child(self, index, child):
+        if child.parent is not None:
+            child.parent.remove_child(child)
+        if self.children is EMPTY_CHILDREN:
+            self.children = []
+        self.children.insert(index, child)
+        child.parent = self
+        # New ancestors can change which selectors match anywhere below
+        child.mark_dirty(DIRTY_SUBTREE)
+
+    def append_child(self, child):
+        self.insert_child(len(self.children), child)
+
+    def remove_child(self, child):
+        self.children.remove(child)
+        child.parent = None
 
     def __repr__(self):
         return "<" + self.tag + ">"
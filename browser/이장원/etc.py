@@ -1,14 +1,21 @@
+import bisect
+import marshal
+import os
+
 from element import Element
+from node import DIRTY, DIRTY_SUBTREE
 from css_parser import CSSParser
+from tag_selector import TagSelector
+from descendant_selector import DescendantSelector
+from rule_index import RuleIndex
+from computed_style import INHERITED_PROPERTIES, DEFAULT_FONT_SIZE, computed_style
 
-DEFAULT_STYLE_SHEET = CSSParser(open("browser.css").read()).parse()
-
-INHERITED_PROPERTIES = {
-    "font-size": "16px",
-    "font-style": "normal",
-    "font-weight": "normal",
-    "color": "black",
-}
+USER_AGENT_STYLE_SHEET = "browser.css"
+STYLE_CACHE_DIR = os.path.expanduser("~/.cache/tf-web-browser/css")
+DEFAULT_RULES = None
+STYLE_STATS = {"walks": 0, "skipped_walks": 0, "shared": 0, "unshared": 0,
+               "styled": 0, "restyled": 0}
+STYLE_SHARING = True
 
 def print_tree(node, indent=0):
     print(" " * indent, node)
@@ -21,31 +28,128 @@ def paint_tree(layout_object, display_list):
     for child in layout_object.children:
         paint_tree(child, display_list)
 
-def style(node, rules):
-    node.style = {}
-    for property, default_value in INHERITED_PROPERTIES.items():
-        if node.parent:
-            node.style[property] = node.parent.style[property]
-        else:
-            node.style[property] = default_value
-    for selector, body in rules:
+def ancestor_counts(node):
+    counts = {}
+    node = node.parent
+    while node:
+        counts[node.tag] = counts.get(node.tag, 0) + 1
+        node = node.parent
+    return counts
+
+def sharing_key(node, parent, parent_style):
+    # Nodes agreeing on all of this get the same rules and inherit the same
+    # values. Selectors only test tags, so the key has to fix every ancestor
+    # tag: the parent's tag is in it, and the grandparent object stands for
+    # the rest. Equal parent styles say nothing about tags, since styles are
+    # interned on their values. Nodes are named by identity, so entries only
+    # hold within one style pass.
+    if not isinstance(node, Element):
+        tag, attributes = None, ()
+    else:
+        tag = node.tag
+        attributes = tuple(sorted(node.attributes.items())) if node.attributes else ()
+    if parent is None:
+        return tag, attributes, None, None, None
+    return tag, attributes, parent.tag, parent.parent, id(parent_style)
+
+def cascade(node, parent_style, rules, ancestors):
+    # Only properties set on this node are stored; the rest are inherited
+    # through parent_style when read
+    properties = {}
+    for selector, body, required in rules.candidates(node):
+        if required:
+            # A missing ancestor tag rules the selector out without a walk
+            if not all(tag in ancestors for tag in required):
+                STYLE_STATS["skipped_walks"] += 1
+                continue
+            STYLE_STATS["walks"] += 1
         if not selector.matches(node): continue
-        for property, value in body.items():
-            node.style[property] = value
+        properties.update(body)
     if isinstance(node, Element) and "style" in node.attributes:
-        pairs = CSSParser(node.attributes["style"]).body()
-        for property, value in pairs.items():
-            node.style[property] = value
-    if node.style["font-size"].endswith("%"):
-        if node.parent:
-            parent_font_size = node.parent.style["font-size"]
+        properties.update(CSSParser(node.attributes["style"]).body())
+    if properties.get("font-size", "").endswith("%"):
+        if parent_style is not None:
+            parent_px = parent_style.font_size
         else:
-            parent_font_size = INHERITED_PROPERTIES["font-size"]
-        node_pct = float(node.style["font-size"][:-1]) / 100
-        parent_px = float(parent_font_size[:-2])
-        node.style["font-size"] = str(node_pct * parent_px) + "px"
-    for child in node.children:
-        style(child, rules)
+            parent_px = DEFAULT_FONT_SIZE
+        node_pct = float(properties["font-size"][:-1]) / 100
+        properties["font-size"] = str(node_pct * parent_px) + "px"
+    return computed_style(properties, parent_style)
+
+def compute_style(node, rules, ancestors):
+    parent = node.parent
+    parent_style = parent.style if parent else None
+    if STYLE_SHARING:
+        key = sharing_key(node, parent, parent_style)
+        node_style = rules.shared_style(key, parent_style)
+        if node_style is not None:
+            STYLE_STATS["shared"] += 1
+        else:
+            STYLE_STATS["unshared"] += 1
+            node_style = cascade(node, parent_style, rules, ancestors)
+            rules.share_style(key, parent_style, node_style)
+    else:
+        node_style = cascade(node, parent_style, rules, ancestors)
+    STYLE_STATS["styled"] += 1
+    return node_style
+
+def enter(ancestors, tag):
+    ancestors[tag] = ancestors.get(tag, 0) + 1
+
+def leave(ancestors, tag):
+    if ancestors[tag] == 1:
+        del ancestors[tag]
+    else:
+        ancestors[tag] -= 1
+
+def style(node, rules, ancestors=None):
+    # Only rules whose rightmost tag fits the node can match it
+    if not isinstance(rules, RuleIndex):
+        rules = RuleIndex(rules)
+    # Tags of the elements above node, kept up to date on the way down
+    if ancestors is None:
+        ancestors = ancestor_counts(node)
+        rules.clear_shared()
+    node.style = compute_style(node, rules, ancestors)
+    # Stored documents are read-only and always clean
+    if node.dirty: node.dirty = 0
+    if isinstance(node, Element):
+        enter(ancestors, node.tag)
+        for child in node.children:
+            style(child, rules, ancestors)
+        leave(ancestors, node.tag)
+
+def inherited_changed(old, new):
+    if old is new: return False
+    if old is None: return True
+    return any(old[p] != new[p] for p in INHERITED_PROPERTIES)
+
+def restyle(node, rules, ancestors=None, forced=False):
+    # Styles nodes marked dirty since the last pass, and the descendants of
+    # any whose inherited values changed; clean subtrees are not visited
+    if not isinstance(rules, RuleIndex):
+        rules = RuleIndex(rules)
+    if ancestors is None:
+        ancestors = ancestor_counts(node)
+        rules.clear_shared()
+    dirty = node.dirty
+    if dirty & DIRTY_SUBTREE:
+        before = STYLE_STATS["styled"]
+        style(node, rules, ancestors)
+        STYLE_STATS["restyled"] += STYLE_STATS["styled"] - before
+        return
+    if not dirty and not forced: return
+    node.dirty = 0
+    if dirty & DIRTY or forced:
+        old = node.style
+        node.style = compute_style(node, rules, ancestors)
+        STYLE_STATS["restyled"] += 1
+        forced = inherited_changed(old, node.style)
+    if isinstance(node, Element):
+        enter(ancestors, node.tag)
+        for child in node.children:
+            restyle(child, rules, ancestors, forced)
+        leave(ancestors, node.tag)
 
 def tree_to_list(tree, list):
     list.append(tree)
@@ -53,6 +157,81 @@ def tree_to_list(tree, list):
         tree_to_list(child, list)
     return list
 
+def stylesheet_sources(nodes):
+    # Linked and inline sheets in document order, which is cascade order
+    sources = []
+    for node in tree_to_list(nodes, []):
+        if not isinstance(node, Element): continue
+        if node.tag == "link" and node.attributes.get("rel") == "stylesheet" \
+                and "href" in node.attributes:
+            sources.append(("link", node.attributes["href"]))
+        elif node.tag == "style" and node.children:
+            sources.append(("style", node.children[0].text))
+    return sources
+
+def stylesheet_links(nodes):
+    return [value for kind, value in stylesheet_sources(nodes) if kind == "link"]
+
+def page_rules(sources, bodies):
+    # bodies are the fetched linked sheets, in the order of their links
+    bodies = iter(bodies)
+    rules = []
+    for kind, value in sources:
+        body = next(bodies) if kind == "link" else value
+        if body is None: continue
+        rules.extend(CSSParser(body).parse())
+    return rules
+
 def cascade_priority(rule):
     selector, body = rule
     return selector.priority
+
+def freeze_selector(selector):
+    if isinstance(selector, DescendantSelector):
+        return (freeze_selector(selector.ancestor),
+                freeze_selector(selector.descendant))
+    return selector.tag
+
+def thaw_selector(frozen):
+    if isinstance(frozen, tuple):
+        return DescendantSelector(thaw_selector(frozen[0]), thaw_selector(frozen[1]))
+    return TagSelector(frozen)
+
+def compiled_style_sheet(path, cache_dir=STYLE_CACHE_DIR):
+    # Rules are cached already sorted, keyed by where the sheet is and when
+    # it last changed, so startup only has to unmarshal them
+    stat = os.stat(path)
+    key = [os.path.abspath(path), stat.st_mtime_ns, stat.st_size]
+    cache = os.path.join(cache_dir, os.path.basename(path) + ".rules")
+    try:
+        with open(cache, "rb") as f:
+            cached_key, frozen = marshal.load(f)
+        if cached_key == key:
+            return [(thaw_selector(selector), body) for selector, body in frozen]
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    with open(path) as f:
+        rules = sorted(CSSParser(f.read()).parse(), key=cascade_priority)
+    frozen = [(freeze_selector(selector), body) for selector, body in rules]
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache + ".tmp", "wb") as f:
+            marshal.dump((key, frozen), f)
+        os.replace(cache + ".tmp", cache)
+    except OSError:
+        pass
+    return rules
+
+def default_rules():
+    global DEFAULT_RULES
+    if DEFAULT_RULES is None:
+        DEFAULT_RULES = compiled_style_sheet(USER_AGENT_STYLE_SHEET)
+    return DEFAULT_RULES
+
+def merge_rules(sorted_rules, rules):
+    merged = sorted_rules.copy()
+    # Insert after every rule of equal priority, as a stable sort would
+    for rule in sorted(rules, key=cascade_priority):
+        i = bisect.bisect_right(merged, cascade_priority(rule), key=cascade_priority)
+        merged.insert(i, rule)
+    return merged
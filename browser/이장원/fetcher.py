@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from connection_pool import ASYNC_POOL
+
+MAX_WORKERS = 16
+MAX_PER_HOST = 6
+
+HOST_LIMITS = {}
+HOST_LIMITS_LOCK = threading.Lock()
+ASYNC_HOST_LIMITS = weakref.WeakKeyDictionary()
+
+def host_limit(url):
+    key = (url.scheme, url.host, url.port)
+    with HOST_LIMITS_LOCK:
+        if key not in HOST_LIMITS:
+            HOST_LIMITS[key] = threading.BoundedSemaphore(MAX_PER_HOST)
+        return HOST_LIMITS[key]
+
+def request_or_none(url):
+    with host_limit(url):
+        try:
+            return url.request()
+        except Exception:
+            return None
+
+def request_all(urls):
+    if len(urls) <= 1:
+        return [request_or_none(url) for url in urls]
+    workers = min(MAX_WORKERS, len(urls))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(request_or_none, urls))
+
+def async_host_limit(url):
+    # Semaphores belong to the running loop
+    limits = ASYNC_HOST_LIMITS.setdefault(asyncio.get_running_loop(), {})
+    key = (url.scheme, url.host, url.port)
+    if key not in limits:
+        limits[key] = asyncio.Semaphore(MAX_PER_HOST)
+    return limits[key]
+
+async def request_or_none_async(url):
+    async with async_host_limit(url):
+        try:
+            return await url.request_async()
+        except Exception:
+            return None
+
+async def resolve_or_none_async(base, link):
+    try:
+        url = base.resolve(link)
+    except Exception:
+        return None
+    return await request_or_none_async(url)
+
+async def request_links_async(base, links):
+    # A link that fails to resolve gives None, like a failed request
+    return await asyncio.gather(*[resolve_or_none_async(base, link) for link in links])
+
+async def close_async():
+    # Call before the loop ends: drops its host limits and closes its
+    # idle connections
+    ASYNC_HOST_LIMITS.pop(asyncio.get_running_loop(), None)
+    await ASYNC_POOL.close_loop()
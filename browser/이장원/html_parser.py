@@ -1,6 +1,16 @@
+import re
+
 from text import Text
 from element import Element
 
+DELIMITER = re.compile("([<>])")
+RAW_TEXT_END = {
+    tag: re.compile("</" + tag + r"[\s/>]", re.IGNORECASE)
+    for tag in ["script", "style"]
+}
+# Enough of the previous chunk to catch an end tag split across chunks
+RAW_TEXT_TAIL = 16
+
 class HTMLParser:
     SELF_CLOSING_TAGS = [
         "area", "base", "br", "col", "embed", "hr", "img", "input",
@@ -11,28 +21,93 @@ class HTMLParser:
         "link", "meta", "title", "style", "script",
     ]
 
-    def __init__(self, body):
+    def __init__(self, body=""):
         self.body = body
         self.unfinished = []
+        self.pending = []
+        self.in_tag = False
+        self.mode = "initial"
+        self.raw_tag = None
 
     def parse(self):
-        text = ""
-        in_tag = False
-        for c in self.body:
-            if c == "<":
-                in_tag = True
+        # Don't hold on to the body once it has been handed to the tokenizer
+        body, self.body = self.body, ""
+        self.feed(body)
+        return self.close()
+
+    def read(self, chunks):
+        for chunk in chunks:
+            self.feed(chunk)
+        return self.close()
+
+    def feed(self, data):
+        if self.raw_tag:
+            data = self.feed_raw(data)
+            if data is None: return
+        # Text runs alternate with the "<" or ">" that ends them
+        parts = DELIMITER.split(data)
+        start = 0
+        if len(parts) > 1 and self.pending:
+            prefix = "".join(self.pending)
+            parts[0] = prefix + parts[0]
+            start = -len(prefix)
+            self.pending = []
+        i = 1
+        while i < len(parts):
+            text = parts[i - 1]
+            end = start + len(text)
+            if parts[i] == "<":
                 if text: self.add_text(text)
-                text = ""
-            elif c == ">":
-                in_tag = False
-                self.add_tag(text)
-                text = ""
             else:
-                text += c
-        if not in_tag and text:
+                self.add_tag(text)
+                if self.raw_tag:
+                    # Script and style contents run to the end tag untokenized
+                    match = RAW_TEXT_END[self.raw_tag].search(data, end + 1)
+                    if not match:
+                        self.pending = [data[end + 1:]] if end + 1 < len(data) else []
+                        self.in_tag = False
+                        return
+                    self.add_raw_text(data[end + 1:match.start()])
+                    start, i = end + 1, i + 2
+                    while start + len(parts[i - 1]) < match.start():
+                        start += len(parts[i - 1]) + 1
+                        i += 2
+                    parts[i - 1] = ""
+                    start = match.start()
+                    continue
+            start = end + 1
+            i += 2
+        if len(parts) > 1:
+            self.in_tag = parts[-2] == "<"
+        if parts[-1]:
+            self.pending.append(parts[-1])
+
+    def feed_raw(self, data):
+        tail = "".join(self.pending[-RAW_TEXT_TAIL:])[-RAW_TEXT_TAIL:]
+        match = RAW_TEXT_END[self.raw_tag].search(tail + data)
+        if not match:
+            self.pending.append(data)
+            return None
+        text = "".join(self.pending) + data
+        end = len(text) - len(tail + data) + match.start()
+        self.pending = []
+        self.add_raw_text(text[:end])
+        return text[end:]
+
+    def add_raw_text(self, text):
+        self.raw_tag = None
+        if text: self.add_text(text)
+
+    def close(self):
+        text = "".join(self.pending)
+        self.pending = []
+        if not self.in_tag and text:
             self.add_text(text)
         return self.finish()
 
+    def root(self):
+        return self.unfinished[0] if self.unfinished else None
+
     def get_attributes(self, text):
         parts = text.split()
         tag = parts[0].casefold()
@@ -50,9 +125,7 @@ class HTMLParser:
     def add_text(self, text):
         if text.isspace(): return
         self.implicit_tags(None)
-        parent = self.unfinished[-1]
-        node = Text(text, parent)
-        parent.children.append(node)
+        self.new_text(text, self.unfinished[-1])
 
     def add_tag(self, tag):
         tag, attributes = self.get_attributes(tag)
@@ -60,29 +133,48 @@ class HTMLParser:
         self.implicit_tags(tag)
         if tag.startswith("/"):
             if len(self.unfinished) == 1: return
-            node = self.unfinished.pop()
-            parent = self.unfinished[-1]
-            parent.children.append(node)
+            self.unfinished.pop()
+            self.update_mode()
         elif tag in self.SELF_CLOSING_TAGS:
-            parent = self.unfinished[-1]
-            node = Element(tag, attributes, parent)
-            parent.children.append(node)
+            self.new_element(tag, attributes, self.unfinished[-1])
         else:
             parent = self.unfinished[-1] if self.unfinished else None
-            node = Element(tag, attributes, parent)
-            self.unfinished.append(node)
+            self.unfinished.append(self.new_element(tag, attributes, parent))
+            self.update_mode()
+            if tag in RAW_TEXT_END: self.raw_tag = tag
+
+    def new_text(self, text, parent):
+        parent.append(Text(text, parent))
+
+    def new_element(self, tag, attributes, parent):
+        node = Element(tag, attributes, parent)
+        # Attach open elements right away so a partial tree can be shown
+        if parent: parent.append(node)
+        return node
+
+    def update_mode(self):
+        # Only the bottom two open elements decide the insertion mode, so
+        # it can be tracked on push and pop instead of rescanning the stack
+        depth = len(self.unfinished)
+        if depth == 0:
+            self.mode = "initial"
+        elif depth == 1:
+            self.mode = "before head"
+        elif depth == 2 and self.unfinished[1].tag == "head":
+            self.mode = "in head"
+        else:
+            self.mode = "in body"
 
     def implicit_tags(self, tag):
         while True:
-            open_tags = [node.tag for node in self.unfinished]
-            if open_tags == [] and tag != "html":
+            if self.mode == "initial" and tag != "html":
                 self.add_tag("html")
-            elif open_tags == ["html"] and tag not in ["head", "body", "/html"]:
+            elif self.mode == "before head" and tag not in ["head", "body", "/html"]:
                 if tag in self.HEAD_TAGS:
                     self.add_tag("head")
                 else:
                     self.add_tag("body")
-            elif open_tags == ["html", "head"] and tag not in ["/head"] + self.HEAD_TAGS:
+            elif self.mode == "in head" and tag != "/head" and tag not in self.HEAD_TAGS:
                 self.add_tag("/head")
             else:
                 break
@@ -91,7 +183,6 @@ class HTMLParser:
         if not self.unfinished:
             self.implicit_tags(None)
         while len(self.unfinished) > 1:
-            node = self.unfinished.pop()
-            parent = self.unfinished[-1]
-            parent.children.append(node)
+            self.unfinished.pop()
+        self.mode = "initial"
         return self.unfinished.pop()
@@ -0,0 +1,177 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+
+CACHE_DIR = os.path.expanduser("~/.cache/tf-web-browser/http")
+MAX_CACHE_SIZE = 64 * 1024 * 1024
+STORED_HEADERS = ["content-type", "etag", "last-modified", "cache-control"]
+
+def cache_control(headers):
+    directives = {}
+    for part in headers.get("cache-control", "").split(","):
+        if not part.strip(): continue
+        name, _, value = part.strip().partition("=")
+        directives[name.casefold()] = value.strip('"')
+    return directives
+
+class HTTPCache:
+    def __init__(self, directory=CACHE_DIR, max_size=MAX_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.index = None
+        # Set when only the LRU order or a dropped entry is unsaved
+        self.dirty = False
+        self.lock = threading.RLock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0,
+                      "stores": 0, "evictions": 0}
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def load_index(self):
+        if self.index is not None: return
+        try:
+            with open(self.path("index.json")) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self.path("index.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.path("index.json"))
+        self.dirty = False
+
+    def flush(self):
+        # Hits only reorder the index, so it is written at the next store
+        # or on exit rather than on every hit
+        with self.lock:
+            if self.dirty and self.index is not None:
+                self.save_index()
+
+    def contains(self, url):
+        with self.lock:
+            self.load_index()
+            return url in self.index
+
+    def lookup(self, url):
+        with self.lock:
+            self.load_index()
+            entry = self.index.get(url)
+            if entry is None: return None
+            try:
+                with open(self.path(entry["file"]), "rb") as f:
+                    body = f.read()
+            except OSError:
+                del self.index[url]
+                self.dirty = True
+                return None
+            # Re-inserting keeps the index in least-recently-used order
+            self.index[url] = self.index.pop(url)
+            return entry, body
+
+    def fresh(self, entry):
+        return time.time() - entry["stored_at"] < entry["max_age"]
+
+    def validators(self, entry):
+        headers = {}
+        if "etag" in entry["headers"]:
+            headers["If-None-Match"] = entry["headers"]["etag"]
+        if "last-modified" in entry["headers"]:
+            headers["If-Modified-Since"] = entry["headers"]["last-modified"]
+        return headers
+
+    def hit(self, url, revalidated=False, headers={}):
+        with self.lock:
+            entry = self.index.get(url)
+            if entry is None: return
+            if revalidated:
+                self.stats["revalidated"] += 1
+                entry["stored_at"] = time.time()
+                for header in STORED_HEADERS:
+                    if header in headers:
+                        entry["headers"][header] = headers[header]
+                entry["max_age"] = self.max_age(entry["headers"])
+                self.save_index()
+            else:
+                self.stats["hits"] += 1
+                self.dirty = True
+
+    def miss(self):
+        with self.lock:
+            self.stats["misses"] += 1
+
+    def max_age(self, headers):
+        directives = cache_control(headers)
+        if "no-cache" in directives: return 0
+        try:
+            return int(directives.get("max-age", 0))
+        except ValueError:
+            return 0
+
+    def cacheable(self, status, headers):
+        if status != "200" or "no-store" in cache_control(headers):
+            return False
+        return bool(self.max_age(headers)) or "etag" in headers \
+            or "last-modified" in headers
+
+    def store(self, url, status, headers, body):
+        if not self.cacheable(status, headers): return
+        with self.lock:
+            max_age = self.max_age(headers)
+            self.load_index()
+            name = hashlib.sha256(url.encode("utf8")).hexdigest()
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path(name), "wb") as f:
+                f.write(body)
+            self.index.pop(url, None)
+            self.index[url] = {
+                "file": name,
+                "size": len(body),
+                "stored_at": time.time(),
+                "max_age": max_age,
+                "headers": {header: headers[header]
+                            for header in STORED_HEADERS if header in headers},
+            }
+            self.stats["stores"] += 1
+            self.evict()
+            self.save_index()
+
+    def size(self):
+        with self.lock:
+            self.load_index()
+            return sum(entry["size"] for entry in self.index.values())
+
+    def evict(self):
+        total = self.size()
+        while total > self.max_size and self.index:
+            url = next(iter(self.index))
+            entry = self.index.pop(url)
+            total -= entry["size"]
+            try:
+                os.remove(self.path(entry["file"]))
+            except OSError:
+                pass
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        with self.lock:
+            self.load_index()
+            for entry in self.index.values():
+                try:
+                    os.remove(self.path(entry["file"]))
+                except OSError:
+                    pass
+            self.index = {}
+            self.save_index()
+
+CACHE = HTTPCache()
+atexit.register(CACHE.flush)
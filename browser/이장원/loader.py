@@ -0,0 +1,45 @@
+import asyncio
+import sys
+
+from url import URL
+from fetcher import request_links_async, close_async
+from dom_cache import DOM_CACHE
+from rule_index import RuleIndex
+from etc import style, default_rules, merge_rules, stylesheet_sources, page_rules
+
+MAX_IN_FLIGHT = 256
+
+async def load_async(url):
+    body = await url.request_async()
+    # Identical bodies are restored from a snapshot instead of reparsed; the
+    # snapshot may be read from or written to disk, so not on the loop
+    nodes = await asyncio.to_thread(DOM_CACHE.parse, body)
+    sources = stylesheet_sources(nodes)
+    links = [value for kind, value in sources if kind == "link"]
+    bodies = await request_links_async(url, links)
+    rules = RuleIndex(merge_rules(default_rules(), page_rules(sources, bodies)))
+    style(nodes, rules)
+    # The rules are returned too, for restyling after mutations
+    return nodes, rules
+
+async def load_all_async(urls, max_in_flight=MAX_IN_FLIGHT):
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def load_one(url):
+        async with semaphore:
+            try:
+                nodes, rules = await load_async(url)
+                return nodes
+            except Exception:
+                return None
+
+    try:
+        return await asyncio.gather(*[load_one(url) for url in urls])
+    finally:
+        await close_async()
+
+if __name__ == "__main__":
+    urls = [URL(arg) for arg in sys.argv[1:]]
+    pages = asyncio.run(load_all_async(urls))
+    for url, nodes in zip(urls, pages):
+        print(url, "failed" if nodes is None else "ok")
@@ -0,0 +1,37 @@
+import types
+import weakref
+
+EMPTY_ATTRIBUTES = types.MappingProxyType({})
+EMPTY_CHILDREN = ()
+# Weak parent pointers break the parent/child cycles, so a dropped tree is
+# freed by reference counting alone, but the caller must keep the root alive
+WEAK_PARENTS = False
+
+# Dirty bits: the node's own style is stale, something below it is, or
+# the node was inserted and its whole subtree needs styling
+DIRTY = 1
+CHILD_DIRTY = 2
+DIRTY_SUBTREE = 4
+
+class Node:
+    __slots__ = ("_parent", "style", "dirty", "__weakref__")
+
+    @property
+    def parent(self):
+        parent = self._parent
+        if type(parent) is weakref.ref:
+            return parent()
+        return parent
+
+    @parent.setter
+    def parent(self, parent):
+        if WEAK_PARENTS and parent is not None:
+            parent = weakref.ref(parent)
+        self._parent = parent
+
+    def mark_dirty(self, flag=DIRTY):
+        self.dirty |= flag
+        node = self.parent
+        while node is not None and not node.dirty & CHILD_DIRTY:
+            node.dirty |= CHILD_DIRTY
+            node = node.parent
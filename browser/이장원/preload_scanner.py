@@ -0,0 +1,54 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from fetcher import MAX_WORKERS, request_or_none
+from html_parser import HTMLParser
+
+LINK_TAG = re.compile(r"<(link\b[^>]*)>", re.IGNORECASE)
+MAX_TAIL = 4096
+
+class PreloadScanner:
+    def __init__(self, url):
+        self.url = url
+        self.tail = ""
+        self.requests = {}
+        self.executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+        self.stats = {"preloaded": 0, "missed": 0}
+
+    def feed(self, chunk):
+        data = self.tail + chunk
+        end = 0
+        for match in LINK_TAG.finditer(data):
+            tag, attributes = HTMLParser().get_attributes(match.group(1))
+            if tag == "link" and attributes.get("rel") == "stylesheet" \
+               and "href" in attributes:
+                self.start(attributes["href"])
+            end = match.end()
+        # Keep an unterminated tag around for the next chunk
+        start = data.rfind("<", end)
+        if start >= 0 and ">" not in data[start:] and len(data) - start < MAX_TAIL:
+            self.tail = data[start:]
+        else:
+            self.tail = ""
+
+    def start(self, href):
+        if href in self.requests: return
+        try:
+            url = self.url.resolve(href)
+        except Exception:
+            return
+        self.requests[href] = self.executor.submit(request_or_none, url)
+
+    def request_all(self, links):
+        for link in links:
+            if link in self.requests:
+                self.stats["preloaded"] += 1
+            else:
+                self.stats["missed"] += 1
+                self.start(link)
+        # A link that failed to resolve has no request and is skipped
+        return [self.requests[link].result() if link in self.requests else None
+                for link in links]
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,54 @@
+import asyncio
+import socket
+import threading
+import time
+
+DNS_TTL = 60
+
+class Resolver:
+    def __init__(self, ttl=DNS_TTL):
+        self.ttl = ttl
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {"hits": 0, "misses": 0}
+
+    def cached(self, host, port):
+        with self.lock:
+            entry = self.cache.get((host, port))
+            if entry and entry[1] > time.monotonic():
+                self.stats["hits"] += 1
+                return entry[0]
+            self.stats["misses"] += 1
+            return None
+
+    def remember(self, host, port, infos):
+        address = infos[0][4]
+        with self.lock:
+            self.cache[(host, port)] = (address, time.monotonic() + self.ttl)
+        return address
+
+    def resolve(self, host, port):
+        address = self.cached(host, port)
+        if address: return address
+        infos = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_STREAM)
+        return self.remember(host, port, infos)
+
+    async def resolve_async(self, host, port):
+        address = self.cached(host, port)
+        if address: return address
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            host, port, family=socket.AF_INET, type=socket.SOCK_STREAM)
+        return self.remember(host, port, infos)
+
+    def forget(self, host, port):
+        with self.lock:
+            self.cache.pop((host, port), None)
+
+    def clear(self):
+        with self.lock:
+            self.cache = {}
+
+RESOLVER = Resolver()
@@ -0,0 +1,63 @@
+from element import Element
+from tag_selector import TagSelector
+from descendant_selector import DescendantSelector
+
+SHARED_STYLES = 256
+
+def selector_tags(selector):
+    if isinstance(selector, DescendantSelector):
+        return selector_tags(selector.ancestor) | selector_tags(selector.descendant)
+    return {selector.tag} if isinstance(selector, TagSelector) else set()
+
+def required_ancestors(selector):
+    # Tags that must all be somewhere above a node for the selector to match
+    if isinstance(selector, DescendantSelector):
+        return selector_tags(selector.ancestor) | required_ancestors(selector.descendant)
+    return set()
+
+def rightmost_tag(selector):
+    while isinstance(selector, DescendantSelector):
+        selector = selector.descendant
+    return selector.tag if isinstance(selector, TagSelector) else None
+
+class RuleIndex:
+    def __init__(self, rules):
+        self.rules = rules
+        buckets = {}
+        universal = []
+        for position, (selector, body) in enumerate(rules):
+            rule = (selector, body, tuple(required_ancestors(selector)))
+            tag = rightmost_tag(selector)
+            if tag is None:
+                universal.append((position, rule))
+            else:
+                buckets.setdefault(tag, []).append((position, rule))
+        # Each bucket gets the universal rules merged in ahead of time, in
+        # their original cascade order, so a lookup is one dict access
+        self.universal = [rule for position, rule in universal]
+        self.by_tag = {}
+        for tag, bucket in buckets.items():
+            self.by_tag[tag] = [rule for position, rule in sorted(bucket + universal)]
+        self.shared = {}
+
+    def candidates(self, node):
+        if isinstance(node, Element):
+            return self.by_tag.get(node.tag, self.universal)
+        return self.universal
+
+    def clear_shared(self):
+        # Entries name nodes by identity, which a mutated tree can't vouch for
+        self.shared = {}
+
+    def shared_style(self, key, parent_style):
+        entry = self.shared.get(key)
+        # The key holds the parent style's id, so check it is still that object
+        if entry and entry[0] is parent_style:
+            return entry[1]
+        return None
+
+    def share_style(self, key, parent_style, style):
+        self.shared.pop(key, None)
+        self.shared[key] = (parent_style, style)
+        if len(self.shared) > SHARED_STYLES:
+            del self.shared[next(iter(self.shared))]
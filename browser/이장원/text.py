@@ -1,8 +1,13 @@
-class Text:
+from node import Node, EMPTY_CHILDREN
+
+class Text(Node):
+    __slots__ = ("text",)
+    children = EMPTY_CHILDREN
+
     def __init__(self, text, parent):
         self.text = text
-        self.children = []
         self.parent = parent
+        self.dirty = 0
 
     def __repr__(self):
         return repr(self.text)
@@ -1,10 +1,33 @@
-import socket
+import asyncio
+import base64
+import mmap
+import os
 import ssl
+import urllib.parse
+
+from connection_pool import POOL, ASYNC_POOL, BUFFER_SIZE
+from body_decoder import BodyDecoder, ACCEPT_ENCODING
+from http_cache import CACHE
+from charset import decode_body, StreamDecoder
+
+def response_decoder(version, status, headers):
+    connection = headers.get("connection", "").casefold()
+    if version == "HTTP/1.0":
+        reusable = connection == "keep-alive"
+    else:
+        reusable = connection != "close"
+    has_body = not (status.startswith("1") or status in ["204", "304"])
+    return BodyDecoder(headers, has_body), reusable
 
 class URL:
     def __init__(self, url):
+        if url.startswith("data:"):
+            self.scheme, self.path = url.split(":", 1)
+            self.host, self.port = "", None
+            return
+
         self.scheme, url = url.split("://", 1)
-        assert self.scheme in ["http", "https"]
+        assert self.scheme in ["http", "https", "file"]
 
         if "/" not in url:
             url = url + "/"
@@ -15,51 +38,250 @@ class URL:
             self.port = 80
         elif self.scheme == "https":
             self.port = 443
+        elif self.scheme == "file":
+            self.port = None
+            return
 
         if ":" in self.host:
             self.host, port = self.host.split(":", 1)
             self.port = int(port)
 
-    def request(self):
-        s = socket.socket(
-            family=socket.AF_INET,
-            type=socket.SOCK_STREAM,
-            proto=socket.IPPROTO_TCP
-        )
+    def request(self, keep_alive=True, use_cache=True):
+        if self.scheme in ["file", "data"]:
+            return self.read_local()
+        if not use_cache:
+            status, headers, body = self.fetch(keep_alive)
+            return decode_body(body, headers.get("content-type", ""))
+
+        key = str(self)
+        cached = CACHE.lookup(key)
+        if cached and CACHE.fresh(cached[0]):
+            CACHE.hit(key)
+            return self.decode_cached(cached)
+
+        extra_headers = CACHE.validators(cached[0]) if cached else {}
+        status, headers, body = self.fetch(keep_alive, extra_headers)
+        return self.cache_response(key, cached, status, headers, body)
+
+    async def request_async(self, use_cache=True):
+        # Disk reads and cache writes go to a thread to keep the loop free
+        if self.scheme in ["file", "data"]:
+            return await asyncio.to_thread(self.read_local)
+        if not use_cache:
+            status, headers, body = await self.fetch_async()
+            return decode_body(body, headers.get("content-type", ""))
+
+        key = str(self)
+        cached = await asyncio.to_thread(CACHE.lookup, key)
+        if cached and CACHE.fresh(cached[0]):
+            CACHE.hit(key)
+            return self.decode_cached(cached)
+
+        extra_headers = CACHE.validators(cached[0]) if cached else {}
+        status, headers, body = await self.fetch_async(extra_headers)
+        return await asyncio.to_thread(
+            self.cache_response, key, cached, status, headers, body)
+
+    def cache_response(self, key, cached, status, headers, body):
+        if status == "304" and cached:
+            CACHE.hit(key, revalidated=True, headers=headers)
+            return self.decode_cached(cached)
+        CACHE.miss()
+        CACHE.store(key, status, headers, body)
+        return decode_body(body, headers.get("content-type", ""))
+
+    def decode_cached(self, cached):
+        entry, body = cached
+        return decode_body(body, entry["headers"].get("content-type", ""))
+
+    def stream(self, keep_alive=True, use_cache=True):
+        if self.scheme in ["file", "data"]:
+            yield from self.stream_local()
+            return
+
+        key = str(self)
+        cached = CACHE.lookup(key) if use_cache else None
+        if cached and CACHE.fresh(cached[0]):
+            CACHE.hit(key)
+            yield self.decode_cached(cached)
+            return
+
+        extra_headers = CACHE.validators(cached[0]) if cached else {}
+        status, headers, chunks = self.fetch_stream(keep_alive, extra_headers)
+        if status == "304" and cached:
+            for chunk in chunks: pass
+            CACHE.hit(key, revalidated=True, headers=headers)
+            yield self.decode_cached(cached)
+            return
+
+        if use_cache: CACHE.miss()
+        store = use_cache and CACHE.cacheable(status, headers)
+        body = []
+        decoder = StreamDecoder(headers.get("content-type", ""))
+        for chunk in chunks:
+            if store: body.append(chunk)
+            text = decoder.feed(chunk)
+            if text: yield text
+        text = decoder.finish()
+        if text: yield text
+        if store: CACHE.store(key, status, headers, b"".join(body))
+
+    def read_local(self):
+        if self.scheme == "data":
+            media_type, data = self.data()
+            return decode_body(data, media_type)
+        with open(self.file_path(), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0: return ""
+            # Decoding straight from the mapping avoids a bytes copy
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as body:
+                return decode_body(body)
+
+    def stream_local(self):
+        if self.scheme == "data":
+            yield self.read_local()
+            return
+        with open(self.file_path(), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0: return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as body:
+                decoder = StreamDecoder()
+                for i in range(0, len(body), BUFFER_SIZE):
+                    text = decoder.feed(body[i:i + BUFFER_SIZE])
+                    if text: yield text
+                text = decoder.finish()
+                if text: yield text
 
-        s.connect((self.host, self.port))
+    def file_path(self):
+        return urllib.parse.unquote(self.path.split("?", 1)[0].split("#", 1)[0])
 
-        if self.scheme == "https":
-            ctx = ssl.create_default_context()
-            s = ctx.wrap_socket(s, server_hostname=self.host)
+    def data(self):
+        media_type, data = self.path.split(",", 1)
+        if media_type.endswith(";base64"):
+            return media_type[:-len(";base64")], base64.b64decode(data)
+        return media_type, urllib.parse.unquote_to_bytes(data)
 
-        request = f"GET {self.path} HTTP/1.0\r\n"
+    def fetch(self, keep_alive=True, extra_headers={}):
+        status, headers, chunks = self.fetch_stream(keep_alive, extra_headers)
+        return status, headers, b"".join(chunks)
+
+    def fetch_stream(self, keep_alive=True, extra_headers={}):
+        http_version = "HTTP/1.1" if keep_alive else "HTTP/1.0"
+        if keep_alive:
+            conn, reused = POOL.acquire(self.scheme, self.host, self.port)
+        else:
+            conn, reused = POOL.connect(self.scheme, self.host, self.port), False
+        try:
+            version, status, headers = self.send(conn, http_version, extra_headers)
+        except (ConnectionError, ssl.SSLError):
+            POOL.close(conn)
+            if not reused: raise
+            conn = POOL.connect(self.scheme, self.host, self.port)
+            version, status, headers = self.send(conn, http_version, extra_headers)
+        decoder, reusable = response_decoder(version, status, headers)
+        chunks = self.read_body(conn, decoder, keep_alive and reusable)
+        return status, headers, chunks
+
+    def read_body(self, conn, decoder, reusable):
+        s, response = conn
+        try:
+            while not decoder.done:
+                data = response.read1(BUFFER_SIZE)
+                if not data: break
+                yield decoder.feed(data)
+            yield decoder.finish()
+        except BaseException:
+            POOL.close(conn)
+            raise
+        if reusable and decoder.delimited:
+            POOL.release(self.scheme, self.host, self.port, conn)
+        else:
+            POOL.close(conn)
+
+    async def fetch_async(self, extra_headers={}):
+        conn, reused = await ASYNC_POOL.acquire(self.scheme, self.host, self.port)
+        try:
+            version, status, headers = await self.send_async(conn, extra_headers)
+        except (ConnectionError, ssl.SSLError, asyncio.IncompleteReadError):
+            ASYNC_POOL.close(conn)
+            if not reused: raise
+            conn = await ASYNC_POOL.connect(self.scheme, self.host, self.port)
+            version, status, headers = await self.send_async(conn, extra_headers)
+
+        decoder, reusable = response_decoder(version, status, headers)
+        reader, writer = conn
+        body = []
+        try:
+            while not decoder.done:
+                data = await reader.read(BUFFER_SIZE)
+                if not data: break
+                body.append(decoder.feed(data))
+            body.append(decoder.finish())
+        except BaseException:
+            ASYNC_POOL.close(conn)
+            raise
+
+        if reusable and decoder.delimited:
+            ASYNC_POOL.release(self.scheme, self.host, self.port, conn)
+        else:
+            ASYNC_POOL.close(conn)
+        return status, headers, b"".join(body)
+
+    def request_head(self, http_version, extra_headers):
+        request = f"GET {self.path} {http_version}\r\n"
         request += f"Host: {self.host}\r\n"
+        request += f"Accept-Encoding: {ACCEPT_ENCODING}\r\n"
+        for header, value in extra_headers.items():
+            request += f"{header}: {value}\r\n"
         request += "\r\n"
-        s.send(request.encode("utf8"))
+        return request.encode("utf8")
 
-        response = s.makefile("r", encoding="utf8", newline="\r\n")
+    def send(self, conn, http_version, extra_headers={}):
+        s, response = conn
+        s.sendall(self.request_head(http_version, extra_headers))
 
-        status_line = response.readline()
+        status_line = response.readline().decode("utf8")
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
         version, status, explanation = status_line.split(" ", 2)
 
         response_headers = {}
         while True:
-            line = response.readline()
-            if line == "\r\n": break
+            line = response.readline().decode("utf8")
+            if line in ["\r\n", ""]: break
             header, value = line.split(":", 1)
             response_headers[header.casefold()] = value.strip()
+        return version, status, response_headers
+
+    async def send_async(self, conn, extra_headers={}):
+        reader, writer = conn
+        writer.write(self.request_head("HTTP/1.1", extra_headers))
+        await writer.drain()
 
-        assert "transfer-encoding" not in response_headers
-        assert "content-encoding" not in response_headers
+        status_line = (await reader.readline()).decode("utf8")
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
+        version, status, explanation = status_line.split(" ", 2)
 
-        body = response.read()
-        s.close()
+        response_headers = {}
+        while True:
+            line = (await reader.readline()).decode("utf8")
+            if line in ["\r\n", ""]: break
+            header, value = line.split(":", 1)
+            response_headers[header.casefold()] = value.strip()
+        return version, status, response_headers
 
-        return body
+    def __str__(self):
+        if self.scheme == "data":
+            return "data:" + self.path
+        if self.scheme == "file":
+            return "file://" + self.host + self.path
+        port = ""
+        if not ((self.scheme == "https" and self.port == 443) or
+                (self.scheme == "http" and self.port == 80)):
+            port = ":" + str(self.port)
+        return self.scheme + "://" + self.host + port + self.path
 
     def resolve(self, url):
-        if "://" in url:
+        if "://" in url or url.startswith("data:"):
             return URL(url)
         if not url.startswith("/"):
             dir, _ = self.path.rsplit("/", 1)
@@ -70,5 +292,7 @@ class URL:
             url = dir + "/" + url
         if url.startswith("//"):
             return URL(self.scheme + ":" + url)
+        elif self.scheme == "file":
+            return URL("file://" + self.host + url)
         else:
             return URL(self.scheme + "://" + self.host + ":" + str(self.port) + url)